@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LocalTTLCache:
+    """
+    A small thread-safe LRU whose entries also expire after `timeout`
+    seconds. It lives in one process, so other workers only see an
+    invalidation once their copy expires; keep the timeout short.
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, predicate):
+        with self.lock:
+            for key in [key for key, (_, value) in self.entries.items() if predicate(key, value)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TokenCache:
+    """
+    Token key -> {'user_id', 'created'} in a per-process LRU in front of the
+    shared cache. Keys are stored as hashes and the entries hold neither the
+    key nor the user, so the shared cache never holds a usable credential.
+    """
+
+    def __init__(self):
+        self.local = LocalTTLCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT)
+
+    def digest(self, key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        digest = self.digest(key)
+        entry = self.local.get(digest)
+        if entry is None:
+            entry = cache.get(f'auth-token:{digest}')
+            if entry is not None:
+                self.local.set(digest, entry)
+        return entry
+
+    def set(self, key, token):
+        digest = self.digest(key)
+        entry = {'user_id': token.user_id, 'created': token.created}
+        cache.set(f'auth-token:{digest}', entry, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self.local.set(digest, entry)
+
+    def invalidate_key(self, key):
+        digest = self.digest(key)
+        cache.delete(f'auth-token:{digest}')
+        self.local.discard(lambda cached_digest, entry: cached_digest == digest)
+
+    def clear(self):
+        self.local.clear()
+
+
+token_cache = TokenCache()
+
+
+# Token.created doubles as the last renewal time: a token expires
+# AUTH_TOKEN_TTL after it was last renewed, and it is renewed at most once
+# per AUTH_TOKEN_RENEW_INTERVAL so active clients do not write on every request.
+
+def token_expired(token, now=None):
+    return token.created + timedelta(seconds=settings.AUTH_TOKEN_TTL) <= (now or timezone.now())
+
+
+def renew_token(token, now=None):
+    """Push the expiry of `token` forward if its renewal window has passed."""
+    now = now or timezone.now()
+    if now - token.created < timedelta(seconds=settings.AUTH_TOKEN_RENEW_INTERVAL):
+        return
+    # Matching on the old stamp makes concurrent renewals write once
+    Token.objects.filter(key=token.key, created=token.created).update(created=now)
+    token.created = now
+    token_cache.set(token.key, token)
+
+
+def issue_token(user):
+    """Return the user's token, replacing it if it has expired."""
+    token, created = Token.objects.get_or_create(user=user)
+    if created:
+        return token
+    token.user = user
+    if token_expired(token):
+        token.delete()
+        return Token.objects.create(user=user)
+    renew_token(token)
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in TokenAuthentication that looks the token up through the cache
+    and reads only the user row while it is cached. The user is always read
+    fresh, so request.user can be saved like any other instance.
+    Deactivated accounts (IsActive=False) are refused like inactive ones,
+    and expired tokens are deleted and refused. See accounts.signals for
+    invalidation.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        else:
+            user = get_user_model().objects.filter(pk=entry['user_id']).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token = Token(key=key, user=user, created=entry['created'])
+        if not token.user.is_active or not token.user.IsActive:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        now = timezone.now()
+        if token_expired(token, now):
+            token.delete()
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        renew_token(token, now)
+        return (token.user, token)
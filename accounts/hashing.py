@@ -0,0 +1,93 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import exceptions
+
+# Password hashing is deliberately slow CPU work. PooledPBKDF2PasswordHasher
+# derives keys in a small process pool, so make_password(), check_password()
+# and authenticate() all go through it with their usual backends and signals.
+#
+# The request worker still waits for its hash; what the pool buys is a
+# bound. At most PASSWORD_HASHER_WORKERS hashes burn CPU at once, at most
+# workers + PASSWORD_HASHER_MAX_PENDING request workers wait on them, and
+# any login beyond that gets a fast 429 instead of joining a queue that
+# holds every worker until clients time out. Keep that sum well below the
+# number of request workers. benchmarks/login_storm.py --serve measures it.
+
+
+class PasswordHasherBusy(exceptions.Throttled):
+    default_detail = 'Too many password checks in progress, try again shortly.'
+    default_code = 'password_hasher_busy'
+
+    def __init__(self):
+        super().__init__(wait=settings.PASSWORD_HASHER_RETRY_AFTER)
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+class PasswordHasherPool:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.slots = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                workers = settings.PASSWORD_HASHER_WORKERS
+                self.slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHER_MAX_PENDING)
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_setup_worker,
+                )
+            return self.executor
+
+    def run(self, fn, *args):
+        """Run `fn(*args)` in the pool, or inline when PASSWORD_HASHER_WORKERS is 0."""
+        if not settings.PASSWORD_HASHER_WORKERS:
+            return fn(*args)
+        executor = self.get_executor()
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=settings.PASSWORD_HASHER_TIMEOUT)
+        except TimeoutError:
+            raise PasswordHasherBusy()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+
+pool = PasswordHasherPool()
+
+
+def _encode(password, salt, iterations):
+    return PBKDF2PasswordHasher().encode(password, salt, iterations)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2PasswordHasher that runs the key derivation in the pool. It keeps
+    the pbkdf2_sha256 algorithm name, so existing hashes still verify; list
+    it in PASSWORD_HASHERS in place of PBKDF2PasswordHasher. Raises
+    PasswordHasherBusy when the pool is full.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return pool.run(_encode, password, salt, iterations)
@@ -1,3 +1,4 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from accounts.models import User
@@ -376,8 +377,6 @@ class Command(BaseCommand):
             )
             if created:
                 products.append(product)
-                # Add product to seller's Products ManyToMany field
-                seller.Products.add(product)
                 self.stdout.write(f'Created product: {product.name} by {seller.storeName}')
 
         # Create reviews
@@ -408,6 +407,7 @@ class Command(BaseCommand):
                         'review': random.choice(review_texts)
                     }
                 )
+        call_command('rebuild_ratings', stdout=self.stdout)
 
         # Create cart items
         for buyer in buyers[:3]:  # First 3 buyers have items in cart
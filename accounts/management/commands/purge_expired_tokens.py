@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from commerce.purge import purge_in_batches
+
+class Command(BaseCommand):
+    help = 'Delete expired auth tokens and sessions in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch_size = options['batch_size']
+        # Deleting through the ORM sends post_delete, which evicts cached tokens
+        expired = Token.objects.filter(created__lte=now - timedelta(seconds=settings.AUTH_TOKEN_TTL))
+        tokens = purge_in_batches(expired, batch_size)
+        sessions = purge_in_batches(Session.objects.filter(expire_date__lte=now), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {tokens} expired tokens and {sessions} expired sessions.'))
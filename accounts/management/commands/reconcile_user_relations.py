@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from accounts.reconcile import reconcile_user_relations
+
+# The last migration state that still has the User join tables
+STATE = ('accounts', '0003_reconcile_user_relations')
+
+
+class Command(BaseCommand):
+    help = 'Move User.Cart/Wishlists/Products join rows into CartItem/WishlistItem in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of join rows processed per transaction',
+        )
+
+    def handle(self, *args, **options):
+        apps = MigrationLoader(connection).project_state(STATE).apps
+        User = apps.get_model('accounts', 'User')
+        through = User._meta.get_field('Cart').remote_field.through
+        if through._meta.db_table not in connection.introspection.table_names():
+            self.stdout.write(self.style.WARNING('The User join tables are already gone. Nothing to do.'))
+            return
+
+        moved = reconcile_user_relations(
+            User,
+            apps.get_model('cart', 'CartItem'),
+            apps.get_model('wishlist', 'WishlistItem'),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {moved['cart']} cart, {moved['wishlist']} wishlist and {moved['products']} product rows."
+        ))
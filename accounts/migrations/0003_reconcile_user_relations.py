@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from accounts.reconcile import reconcile_user_relations
+
+
+def reconcile(apps, schema_editor):
+    reconcile_user_relations(
+        apps.get_model('accounts', 'User'),
+        apps.get_model('cart', 'CartItem'),
+        apps.get_model('wishlist', 'WishlistItem'),
+    )
+
+
+class Migration(migrations.Migration):
+    # Every batch commits on its own; run `manage.py reconcile_user_relations`
+    # before migrating a large database to keep this step short.
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_user_cart_user_isactive_user_products_user_wishlists_and_more'),
+        ('cart', '0001_initial'),
+        ('wishlist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_reconcile_user_relations'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='Cart',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='Products',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='Wishlists',
+        ),
+    ]
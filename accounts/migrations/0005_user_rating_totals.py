@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_remove_user_m2m'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='ratingSum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='ratingCount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -14,14 +14,15 @@ class User(AbstractUser):
     passwordResetVerifed = models.BooleanField(default=False)
     isVerified = models.BooleanField(default=False)
     IsActive = models.BooleanField(default=True)
-    # Wishlists, Cart, Products: ManyToMany to Product (use string ref to avoid circular import)
-    Wishlists = models.ManyToManyField('products.Product', related_name='wishlisted_by', blank=True)
-    Cart = models.ManyToManyField('products.Product', related_name='in_cart_of', blank=True)
+    # Cart, wishlist and listed products live in cart.CartItem, wishlist.WishlistItem and Product.seller
     storeName = models.CharField(max_length=25, unique=True, blank=True, null=True)
     storeDescription = models.CharField(max_length=500, blank=True, null=True)
     rating = models.DecimalField(max_digits=2, decimal_places=1, default=0)
-    Products = models.ManyToManyField('products.Product', related_name='seller_products', blank=True)
+    # Totals over all reviews of the seller's products, kept current by reviews.ratings
+    ratingSum = models.PositiveIntegerField(default=0)
+    ratingCount = models.PositiveIntegerField(default=0)
     permissions = models.JSONField(blank=True, null=True, default=list)  # e.g. ["create", "read"]
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -0,0 +1,55 @@
+from django.db import transaction
+
+# The User.Cart, User.Wishlists and User.Products join tables duplicated
+# cart.CartItem, wishlist.WishlistItem and Product.seller. These helpers move
+# whatever only exists in the join tables into the real models and empty
+# them in short batches. They take model classes so the data migration can
+# pass its historical models and the management command the ones it loads
+# from the migration graph.
+
+
+def _drain(through, batch_size, copy=None):
+    """
+    Walk `through` in primary key order, hand each batch of
+    (user_id, product_id) pairs to `copy`, then delete the batch. Each batch
+    commits on its own so no lock is held for the whole table.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(through.objects.order_by('pk').values_list('pk', 'user_id', 'product_id')[:batch_size])
+            if not rows:
+                return moved
+            if copy is not None:
+                copy([(user_id, product_id) for _, user_id, product_id in rows])
+            through.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        moved += len(rows)
+
+
+def reconcile_user_relations(User, CartItem, WishlistItem, batch_size=1000):
+    """
+    Copy User.Cart rows into CartItem and User.Wishlists rows into
+    WishlistItem, keeping rows that already exist, and drop User.Products
+    rows, which Product.seller already records. Returns the number of join
+    rows processed per table.
+    """
+    def through(name):
+        return User._meta.get_field(name).remote_field.through
+
+    def copy_cart(pairs):
+        CartItem.objects.bulk_create(
+            [CartItem(user_id=user_id, product_id=product_id, quantity=1) for user_id, product_id in pairs],
+            ignore_conflicts=True,
+        )
+
+    def copy_wishlist(pairs):
+        WishlistItem.objects.bulk_create(
+            [WishlistItem(user_id=user_id, product_id=product_id) for user_id, product_id in pairs],
+            ignore_conflicts=True,
+        )
+
+    return {
+        'cart': _drain(through('Cart'), batch_size, copy_cart),
+        'wishlist': _drain(through('Wishlists'), batch_size, copy_wishlist),
+        'products': _drain(through('Products'), batch_size),
+    }
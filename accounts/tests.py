@@ -1,6 +1,26 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from datetime import timedelta
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .authentication import token_cache
+from .hashing import PooledPBKDF2PasswordHasher, pool
 from .models import User
 import json
 
@@ -8,6 +28,7 @@ import json
 # Create your tests here.
 class AuthenticationTest(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
         self.admin = User.objects.create_user(username='adminuser', email='admin@example.com', password='adminpass', role='admin', is_staff=True)
 
@@ -94,11 +115,116 @@ class AuthenticationTest(APITestCase):
         response = self.client.get(reverse('user-profile'))
         self.assertEqual(response.status_code, 401)
 
+class PasswordHasherPoolTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+
+    def test_login_hashes_off_thread(self):
+        """Check if login checks the password in the hasher pool"""
+        self.assertIsInstance(identify_hasher(self.user.password), PooledPBKDF2PasswordHasher)
+        response = self.client.post(reverse('login'), {'username': 'testuser', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('login'), {'username': 'testuser', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_failed_login_sends_signal(self):
+        """Check if a refused login still goes through the backends and sends user_login_failed"""
+        failures = []
+        handler = lambda sender, credentials, **kwargs: failures.append(credentials['username'])
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+        self.client.post(reverse('login'), {'username': 'testuser', 'password': 'wrong'})
+        self.assertEqual(failures, ['testuser'])
+
+    def test_login_rejected_when_hasher_busy(self):
+        """Check if logins beyond the pending limit get a fast 429"""
+        pool.get_executor()
+        taken = 0
+        while pool.slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.post(reverse('login'), {'username': 'testuser', 'password': 'testpass'})
+        finally:
+            for _ in range(taken):
+                pool.slots.release()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class LoginThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='testuser@example.com', password='testpass')
+
+    def test_login_throttled_per_username(self):
+        """Check if repeated attempts on one account are refused without touching the database"""
+        url = reverse('login')
+        for _ in range(5):
+            self.client.post(url, {'username': 'TestUser', 'password': 'wrong'})
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'username': 'testuser', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # Other accounts from the same address are still let through
+        response = self.client.post(url, {'username': 'someone', 'password': 'x'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_refused_login_not_counted_per_ip(self):
+        """Check if attempts refused for the username do not use up the address's allowance"""
+        url = reverse('login')
+        # 5 of these pass the username limit; with the refused 5 counted too,
+        # the address would hit its 20/min limit below
+        for _ in range(10):
+            self.client.post(url, {'username': 'testuser', 'password': 'wrong'})
+        for i in range(10):
+            self.client.post(url, {'username': f'other{i % 2}', 'password': 'wrong'})
+        response = self.client.post(url, {'username': 'someone', 'password': 'x'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_forwarded_for_does_not_pick_the_bucket(self):
+        """Check if a client cannot dodge the address limit by rotating X-Forwarded-For"""
+        url = reverse('register')
+        for i in range(10):
+            self.client.post(url, {'username': f'new{i}'}, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}')
+        response = self.client.post(url, {'username': 'new10'}, HTTP_X_FORWARDED_FOR='10.0.1.1')
+        self.assertEqual(response.status_code, 429)
+
+    def test_register_throttled_per_ip_for_post_only(self):
+        """Check if registrations are limited per address while listing is not"""
+        url = reverse('register')
+        for i in range(10):
+            self.client.post(url, {'username': f'new{i}'})
+        self.assertEqual(self.client.post(url, {'username': 'new10'}).status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
 class UserEndpointsTest(APITestCase):
     def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=self.media, IMAGE_THUMBNAIL_SIZES=[])
+        override.enable()
+        self.addCleanup(override.disable)
         self.user = User.objects.create_user(username='user1', email='user1@example.com', password='userpass')
         self.admin = User.objects.create_user(username='admin1', email='admin1@example.com', password='adminpass', role='admin', is_staff=True)
 
+    def test_admin_export_users(self):
+        """Check if admins can stream users without their password hashes"""
+        self.client.login(username='admin1', password='adminpass')
+        response = self.client.get(reverse('admin-export-users'), {'output': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertNotIn('password', lines[0])
+        self.assertEqual(sorted(line.split(',')[1] for line in lines[1:]), ['admin1', 'user1'])
+
+    def test_export_data_command(self):
+        """Check if export_data writes the same rows as the endpoint"""
+        out = StringIO()
+        call_command('export_data', 'users', '--filter', 'role=admin', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['admin1'])
+
     def test_user_profile(self):
         """Check if users can get their profile"""
         self.client.login(username='user1', password='userpass')
@@ -107,6 +233,16 @@ class UserEndpointsTest(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['username'], 'user1')
 
+    def test_user_profile_not_modified(self):
+        """Check if an unchanged profile is answered with 304"""
+        self.client.force_authenticate(self.user)
+        url = reverse('user-profile')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
     def test_activate_account(self):
         """Check if users can activate their account"""
         self.client.login(username='user1', password='userpass')
@@ -137,12 +273,40 @@ class UserEndpointsTest(APITestCase):
         """Should succeed with a valid small base64 png image string"""
         self.client.login(username='user1', password='userpass')
         url = reverse('user-update-image')
-        # Small valid base64 string for a png
-        fake_data = 'data:image/png;base64,' + ('A' * 100)
+        # Small base64 string that starts with the png signature
+        png = b'\x89PNG\r\n\x1a\n' + b'A' * 100
+        fake_data = 'data:image/png;base64,' + base64.b64encode(png).decode()
         response = self.client.post(url, {'profileImage': fake_data})
         self.assertEqual(response.status_code, 200)
         self.user.refresh_from_db()
-        self.assertEqual(self.user.profileImage, fake_data)
+        # The field keeps the stored file's name under MEDIA_ROOT, fanned out by its content hash
+        digest = hashlib.sha256(png).hexdigest()
+        self.assertEqual(self.user.profileImage, f'images/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertTrue(os.path.exists(os.path.join(self.media, self.user.profileImage)))
+        self.assertEqual(default_storage.url(self.user.profileImage), f'/media/{self.user.profileImage}')
+
+    def test_update_profile_image_not_an_image(self):
+        """Should fail if the data does not start with a png or jpeg signature"""
+        self.client.login(username='user1', password='userpass')
+        url = reverse('user-update-image')
+        fake_data = 'data:image/png;base64,' + ('A' * 100)
+        response = self.client.post(url, {'profileImage': fake_data})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Invalid image type', response.data['detail'])
+
+    def test_update_profile_image_multipart_deduplicated(self):
+        """Check if the same uploaded file is stored once under its hash"""
+        self.client.login(username='user1', password='userpass')
+        url = reverse('user-update-image')
+        jpeg = b'\xff\xd8\xff\xe0' + os.urandom(4096)
+        keys = []
+        for name in ('a.jpg', 'b.jpg'):
+            response = self.client.post(url, {'profileImage': SimpleUploadedFile(name, jpeg)}, format='multipart')
+            self.assertEqual(response.status_code, 200)
+            keys.append(response.data['profileImage'])
+        self.assertEqual(keys[0], keys[1])
+        stored = [name for _, _, files in os.walk(self.media) for name in files]
+        self.assertEqual(stored, [os.path.basename(keys[0])])
 
     def test_get_current_user(self):
         """Check if users can get their current user"""
@@ -206,4 +370,153 @@ class UserEndpointsTest(APITestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.admin.refresh_from_db()
-        self.assertEqual(self.admin.email, 'updated@example.com')
\ No newline at end of file
+        self.assertEqual(self.admin.email, 'updated@example.com')
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='user1', email='user1@example.com', password='userpass')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_lookup(self):
+        """Check if a repeated token request does not query the token table"""
+        url = reverse('user-profile')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Only the user row, which is always read fresh
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['username'], 'user1')
+
+    def test_cache_holds_no_credential(self):
+        """Check if the shared cache keeps only the token's owner and stamp"""
+        self.client.get(reverse('user-profile'))
+        entry = cache.get(f'auth-token:{token_cache.digest(self.token.key)}')
+        self.assertEqual(entry, {'user_id': self.user.pk, 'created': self.token.created})
+
+    def test_profile_reads_past_cached_user(self):
+        """Check if the profile and its ETag follow writes the cached user has not seen"""
+        response = self.client.get(reverse('user-profile'))
+        User.objects.filter(pk=self.user.pk).update(rating=4, updated_at=timezone.now() + timedelta(seconds=1))
+        response = self.client.get(reverse('user-profile'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['rating'], '4.0')
+
+    def test_logout_invalidates_token(self):
+        """Check if a logged out token is refused even though it was cached"""
+        self.client.get(reverse('user-profile'))
+        self.client.post(reverse('logout'))
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_deactivate_invalidates_token(self):
+        """Check if a deactivated account's token stops working"""
+        self.client.get(reverse('user-profile'))
+        self.client.delete(reverse('user-deactivate'))
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_cached_token_reads_current_user(self):
+        """Check if a cached token serves the user as last saved"""
+        self.client.get(reverse('user-profile'))
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('user-profile'))
+        self.assertEqual(response.data['first_name'], 'Renamed')
+
+    def age_token(self, seconds):
+        Token.objects.filter(pk=self.token.key).update(created=timezone.now() - timedelta(seconds=seconds))
+
+    def test_expired_token_refused(self):
+        """Check if a token past its TTL is refused and deleted"""
+        with self.settings(AUTH_TOKEN_TTL=60):
+            self.age_token(120)
+            self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+        self.assertFalse(Token.objects.filter(pk=self.token.key).exists())
+
+    def test_token_renewed_once_per_window(self):
+        """Check if an in-use token's expiry slides forward without a write per request"""
+        with self.settings(AUTH_TOKEN_TTL=600, AUTH_TOKEN_RENEW_INTERVAL=60):
+            self.age_token(120)
+            self.client.get(reverse('user-profile'))
+            renewed = Token.objects.get(pk=self.token.key).created
+            self.assertGreater(renewed, timezone.now() - timedelta(seconds=60))
+            # No renewal write, only the user row
+            with self.assertNumQueries(1):
+                self.client.get(reverse('user-profile'))
+
+    def test_login_replaces_expired_token(self):
+        """Check if logging in issues a new token when the old one expired"""
+        with self.settings(AUTH_TOKEN_TTL=60):
+            self.age_token(120)
+            self.client.credentials()
+            response = self.client.post(reverse('login'), {'username': 'user1', 'password': 'userpass'})
+        self.assertNotEqual(response.data['token'], self.token.key)
+
+    def test_rating_change_reaches_cached_seller(self):
+        """Check if a review's seller totals survive the seller saving a profile edit"""
+        from categories.models import Category
+        from products.models import Product
+        self.user.role = 'seller'
+        self.user.save()
+        product = Product.objects.create(name='Lamp', description='A lamp', price=10, quantity=1,
+                                         category=Category.objects.create(name='Home', description='Home'), seller=self.user)
+        self.client.get(reverse('user-profile'))
+        buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass')
+        buyer_client = APIClient()
+        buyer_client.force_authenticate(buyer)
+        with self.captureOnCommitCallbacks(execute=True):
+            buyer_client.post(reverse('review-add', args=[product.id]), {'rating': 4})
+
+        self.assertEqual(self.client.get(reverse('user-profile')).data['rating'], '4.0')
+        self.client.put(reverse('user-profile-update'), {'first_name': 'Z'})
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.first_name, self.user.ratingSum, self.user.ratingCount), ('Z', 4, 1))
+
+    def test_purge_expired_tokens(self):
+        """Check if the purge command removes only expired tokens"""
+        other = User.objects.create_user(username='user2', email='user2@example.com', password='userpass')
+        fresh = Token.objects.create(user=other)
+        with self.settings(AUTH_TOKEN_TTL=60):
+            self.age_token(120)
+            call_command('purge_expired_tokens', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(Token.objects.values_list('pk', flat=True)), [fresh.key])
+
+
+class ReconcileUserRelationsTest(TransactionTestCase):
+    before = ('accounts', '0002_user_cart_user_isactive_user_products_user_wishlists_and_more')
+
+    def migrate(self, accounts_target=None):
+        # Every other app stays at its latest migration
+        executor = MigrationExecutor(connection)
+        targets = [node for node in executor.loader.graph.leaf_nodes() if node[0] != 'accounts' or accounts_target is None]
+        if accounts_target is not None:
+            targets.append(accounts_target)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate()
+
+    def test_join_rows_moved_into_cart_and_wishlist(self):
+        """Check if the command copies the User join tables and empties them"""
+        apps = self.migrate(self.before)
+        User = apps.get_model('accounts', 'User')
+        Category = apps.get_model('categories', 'Category')
+        Product = apps.get_model('products', 'Product')
+        CartItem = apps.get_model('cart', 'CartItem')
+        user = User.objects.create(username='buyer')
+        category = Category.objects.create(name='Tech', description='Tech')
+        phone = Product.objects.create(name='Phone', description='Phone', price=1, quantity=1, category=category, seller=user)
+        laptop = Product.objects.create(name='Laptop', description='Laptop', price=1, quantity=1, category=category, seller=user)
+        CartItem.objects.create(user=user, product=phone, quantity=4)
+        user.Cart.add(phone, laptop)
+        user.Wishlists.add(laptop)
+        user.Products.add(phone, laptop)
+
+        call_command('reconcile_user_relations', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {phone.pk: 4, laptop.pk: 1})
+        self.assertEqual(list(apps.get_model('wishlist', 'WishlistItem').objects.values_list('product_id', flat=True)), [laptop.pk])
+        self.assertFalse(user.Cart.exists() or user.Wishlists.exists() or user.Products.exists())
@@ -0,0 +1,125 @@
+import hashlib
+import math
+
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Sliding-window rate limit kept in the shared cache, so every worker
+    counts against the same totals.
+
+    Requests are counted in fixed windows of the rate's duration, and the
+    previous window's count is weighted by how much of it still overlaps
+    the sliding window. That costs one get_many and one incr per request,
+    no matter how many requests are allowed. Only `methods` are counted.
+
+    `check()` and `record()` split allow_request() so AllThrottles can
+    count a request only once every limit has let it through.
+    """
+    methods = ('POST',)
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_key(request)
+        if not ident:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def check(self, request, view):
+        self.current_key = None
+        if request.method not in self.methods or self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        elapsed = (now % self.duration) / self.duration
+        current_key, previous_key = f'{self.key}:{window}', f'{self.key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+
+        if previous * (1 - elapsed) + current >= self.num_requests:
+            self.wait_time = self.compute_wait(current, previous, elapsed)
+            return False
+        self.current_key = current_key
+        return True
+
+    def record(self):
+        if self.current_key is None:
+            return
+        try:
+            self.cache.incr(self.current_key)
+        except ValueError:
+            # Two windows' worth so the next window can still weigh it
+            if not self.cache.add(self.current_key, 1, self.duration * 2):
+                self.cache.incr(self.current_key)
+
+    def allow_request(self, request, view):
+        if not self.check(request, view):
+            return False
+        self.record()
+        return True
+
+    def compute_wait(self, current, previous, elapsed):
+        if current >= self.num_requests or not previous:
+            # Only the next window frees anything up
+            return (1 - elapsed) * self.duration
+        # Wait until the previous window's weight has decayed enough
+        needed = 1 - (self.num_requests - current) / previous
+        return max(needed - elapsed, 0) * self.duration
+
+    def wait(self):
+        return math.ceil(self.wait_time)
+
+
+class AllThrottles(BaseThrottle):
+    """
+    Several sliding-window limits that must all pass. A request refused by
+    one is counted by none, so a locked-out username does not also use up
+    its address's allowance.
+    """
+    throttle_classes = ()
+
+    def __init__(self):
+        self.throttles = [throttle_class() for throttle_class in self.throttle_classes]
+        self.refused = []
+
+    def allow_request(self, request, view):
+        self.refused = [throttle for throttle in self.throttles if not throttle.check(request, view)]
+        if self.refused:
+            return False
+        for throttle in self.throttles:
+            throttle.record()
+        return True
+
+    def wait(self):
+        return max(throttle.wait() for throttle in self.refused)
+
+
+class LoginIPThrottle(SlidingWindowThrottle):
+    scope = 'login_ip'
+
+
+class LoginUsernameThrottle(SlidingWindowThrottle):
+    """Limits attempts against one account however many addresses they come from."""
+    scope = 'login_username'
+
+    def get_ident_key(self, request):
+        username = str(request.data.get('username') or '').strip().lower()
+        if not username:
+            return None
+        # Hashed to keep cache keys short and free of user input
+        return hashlib.sha256(username.encode()).hexdigest()
+
+
+class RegisterIPThrottle(SlidingWindowThrottle):
+    scope = 'register_ip'
+
+
+class LoginThrottle(AllThrottles):
+    throttle_classes = (LoginIPThrottle, LoginUsernameThrottle)
@@ -12,6 +12,7 @@ urlpatterns = [
     path('me/deactivate/', views.deactivate_account, name='user-deactivate'),  # DELETE /api/v1/User/me/deactivate
     path('admin/changePassword/<int:user_id>/', views.admin_change_password, name='admin-change-password'),  # POST /api/v1/User/admin/changePassword/:id
     path('admin/', views.admin_create_user, name='admin-create'),  # POST /api/v1/User/admin
+    path('admin/export/', views.admin_export_users, name='admin-export-users'),  # GET /api/v1/User/admin/export/?output=csv
     path('admin/<int:user_id>/', views.admin_get_user, name='admin-get'),  # GET /api/v1/User/admin/:id
     path('admin/<int:user_id>/delete/', views.admin_delete_user, name='admin-delete'),  # DELETE /api/v1/User/admin/:id
     path('admin/<int:user_id>/update/', views.admin_update_user, name='admin-update'),  # PUT /api/v1/User/admin/:id
@@ -1,12 +1,11 @@
 import imghdr
-import base64
 import sys
 from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.db import IntegrityError
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
@@ -14,11 +13,19 @@ from rest_framework.authtoken.models import Token
 
 from .serializers import UserSerializer, RegisterSerializer
 from .models import User
+from .authentication import issue_token
+from .throttling import LoginThrottle, RegisterIPThrottle
+from cart.guest import merge_guest_cart
+from commerce.images import ImageError, store_image_value
+from commerce.conditional import add_validators, not_modified
+from commerce.exports import export_response
 
 
 # Create your views here.
 @api_view(['POST'])
+@authentication_classes([])  # Throttled requests are refused before any token or session lookup
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -33,10 +40,13 @@ def login_view(request):
             return Response({"detail": "Account is deactivated."}, status=status.HTTP_403_FORBIDDEN)
         
         # Create or get token for the user
-        token, created = Token.objects.get_or_create(user=user)
+        token = issue_token(user)
         
         # Also maintain session for backward compatibility
         login(request, user)
+
+        # Carry over anything added to the cart before logging in
+        merge_guest_cart(request, user)
         
         return Response({
             "message": "Login successful",
@@ -68,7 +78,9 @@ def logout_view(request):
     return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
 
 @api_view(['GET', 'POST'])
+@authentication_classes([])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterIPThrottle])
 def register(request):
     # Return all users that are registered
     if request.method == 'GET':
@@ -82,10 +94,13 @@ def register(request):
             user = serializer.save()
             
             # Create token for the new user
-            token, created = Token.objects.get_or_create(user=user)
+            token = issue_token(user)
             
             # Also login for session
             login(request, user)
+
+            # Carry over anything added to the cart before registering
+            merge_guest_cart(request, user)
             
             return Response({
                 "message": "Registration successful",
@@ -106,8 +121,13 @@ def register(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
-    serializer = UserSerializer(request.user)
-    return Response(serializer.data)
+    # request.user is already loaded, so checking the client's copy is free
+    user = request.user
+    response = not_modified(request, user.pk, user.updated_at)
+    if response is not None:
+        return response
+    serializer = UserSerializer(user)
+    return add_validators(Response(serializer.data), user.pk, user.updated_at)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -120,35 +140,23 @@ def activate_account(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_profile_image(request):
+    # Accepts a multipart file, a data:image/...;base64 URI, or a file name
     try:
-        image = request.data.get('profileImage')
-        if not image:
-            return Response({'detail': 'No image provided.'}, status=status.HTTP_400_BAD_REQUEST)
+        image = store_image_value(request, 'profileImage')
+    except ImageError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if not image:
+        return Response({'detail': 'No image provided.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if image.startswith('data:image/'):
-            header, data = image.split(';base64,')
-            file_ext = header.split('/')[-1]
-            allowed_types = ['jpeg', 'jpg', 'png']
-            if file_ext not in allowed_types:
-                return Response({'detail': 'Invalid image type. Only jpg, jpeg, png allowed.'}, status=status.HTTP_400_BAD_REQUEST)
-            try:
-                decoded_file = base64.b64decode(data)
-            except Exception:
-                return Response({'detail': 'Invalid image data.'}, status=status.HTTP_400_BAD_REQUEST)
-            if len(decoded_file) > 2 * 1024 * 1024:
-                return Response({'detail': 'Image size exceeds 2MB.'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            allowed_types = ['jpeg', 'jpg', 'png']
-            if not any(image.lower().endswith('.' + ext) for ext in allowed_types):
-                return Response({'detail': 'Invalid image type. Only jpg, jpeg, png allowed.'}, status=status.HTTP_400_BAD_REQUEST)
+    allowed_types = ['jpeg', 'jpg', 'png']
+    if not any(image.lower().endswith('.' + ext) for ext in allowed_types):
+        return Response({'detail': 'Invalid image type. Only jpg, jpeg, png allowed.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = request.user
-        user.profileImage = image
-        user.save()
-        serializer = UserSerializer(user)
-        return Response(serializer.data)
-    except Exception as e:
-        return Response({'detail': 'Invalid image data.'}, status=status.HTTP_400_BAD_REQUEST)
+    user = request.user
+    user.profileImage = image
+    user.save()
+    serializer = UserSerializer(user)
+    return Response(serializer.data)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
@@ -227,6 +235,11 @@ def admin_create_user(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def admin_export_users(request):
+    return export_response(request, 'users')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
 def admin_get_user(request, user_id):
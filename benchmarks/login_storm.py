@@ -0,0 +1,194 @@
+"""
+Measure catalog latency while the server is hit by a storm of logins.
+
+Start the API (e.g. `gunicorn commerce.wsgi -w 4`) with a populated
+database (`python manage.py populate_db`), then run:
+
+    python benchmarks/login_storm.py --base-url http://127.0.0.1:8000 \\
+        --username buyer1 --password password123 --duration 30
+
+Catalog requests are first timed on their own, then while
+--login-concurrency clients log in as fast as they can. The report shows
+p50/p99 catalog latency for both phases and how many logins succeeded or
+were turned away with 429. Compare runs with PASSWORD_HASHER_WORKERS=0
+(hashing in the request worker) and the default process pool.
+
+With --serve the API runs inside this process instead, on a throwaway
+SQLite database behind --server-threads request threads (standing in for
+a fixed set of sync workers), with the login throttles switched off so
+every login reaches the hasher:
+
+    PASSWORD_HASHER_WORKERS=0 python benchmarks/login_storm.py --serve
+    python benchmarks/login_storm.py --serve
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+CATALOG_PATHS = ['/api/v1/Product/', '/api/v1/Category/']
+
+
+def request(url, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, TimeoutError):
+        return 'error'
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def catalog_client(base_url, stop, latencies):
+    i = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        request(base_url + CATALOG_PATHS[i % len(CATALOG_PATHS)])
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+
+def login_client(base_url, credentials, stop, statuses):
+    while not stop.is_set():
+        statuses[request(base_url + '/api/v1/Auth/login/', credentials)] += 1
+
+
+def run_phase(args, logins):
+    stop = threading.Event()
+    latencies, statuses = [], Counter()
+    credentials = {'username': args.username, 'password': args.password}
+    with ThreadPoolExecutor(args.catalog_concurrency + args.login_concurrency) as executor:
+        for _ in range(args.catalog_concurrency):
+            executor.submit(catalog_client, args.base_url, stop, latencies)
+        if logins:
+            for _ in range(args.login_concurrency):
+                executor.submit(login_client, args.base_url, credentials, stop, statuses)
+        time.sleep(args.duration)
+        stop.set()
+    return latencies, statuses
+
+
+def report(name, latencies, statuses):
+    print(f'{name}: {len(latencies)} catalog requests, '
+          f'p50 {percentile(latencies, 50) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms')
+    if statuses:
+        print('  logins: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)))
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """A WSGI server that handles requests on a fixed number of threads."""
+
+    request_queue_size = 128
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietHandler)
+        self.executor = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.handle_pooled, request, client_address)
+
+    def handle_pooled(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve(args):
+    """Start the API on a temporary database and return its base URL."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'commerce.settings')
+    import django
+    from django.conf import settings
+
+    django.setup()
+    # Before the first connection is opened
+    settings.DATABASES['default'].update(
+        ENGINE='django.db.backends.sqlite3',
+        NAME=os.path.join(tempfile.mkdtemp(), 'login_storm.sqlite3'),
+        OPTIONS={'timeout': 30},
+    )
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from rest_framework.throttling import SimpleRateThrottle
+
+    from accounts.models import User
+    from categories.models import Category
+    from products.models import Product
+
+    call_command('migrate', verbosity=0)
+    seller = User.objects.create_user(username='storm-seller', email='seller@example.com', password=args.password,
+                                      role='seller')
+    User.objects.create_user(username=args.username, email='buyer@example.com', password=args.password)
+    category = Category.objects.create(name='Storm', description='Benchmark products')
+    Product.objects.bulk_create(
+        Product(name=f'Item {i}', description='Benchmark product', price=10, quantity=100, category=category,
+                seller=seller)
+        for i in range(50)
+    )
+    # The storm is meant to reach the hasher, not the per-account limits
+    SimpleRateThrottle.THROTTLE_RATES.update(login_ip=None, login_username=None)
+
+    server = PooledWSGIServer(('127.0.0.1', 0), args.server_threads)
+    server.set_app(get_wsgi_application())
+    # After get_wsgi_application(), which configures logging again: one
+    # warning per 429 would drown the report
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'serving on {args.server_threads} request threads, '
+          f'PASSWORD_HASHER_WORKERS={settings.PASSWORD_HASHER_WORKERS}, '
+          f'PASSWORD_HASHER_MAX_PENDING={settings.PASSWORD_HASHER_MAX_PENDING}')
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--serve', action='store_true', help='Run the API in this process on a throwaway database')
+    parser.add_argument('--server-threads', type=int, default=8, help='Request threads with --serve')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per phase')
+    parser.add_argument('--catalog-concurrency', type=int, default=4)
+    parser.add_argument('--login-concurrency', type=int, default=32)
+    args = parser.parse_args()
+    if args.serve:
+        args.username = args.username or 'storm-buyer'
+        args.password = args.password or 'storm-password'
+        args.base_url = serve(args)
+    elif not (args.username and args.password):
+        parser.error('--username and --password are required without --serve')
+    args.base_url = args.base_url.rstrip('/')
+
+    report('baseline', *run_phase(args, logins=False))
+    report('login storm', *run_phase(args, logins=True))
+
+
+if __name__ == '__main__':
+    main()
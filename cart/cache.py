@@ -0,0 +1,12 @@
+from django.db.models import Sum
+
+from commerce.cache import CachedCount
+
+from .models import CartItem
+
+
+def _count_cart_items(user_id):
+    return CartItem.objects.filter(user_id=user_id).aggregate(count=Sum('quantity'))['count'] or 0
+
+
+cart_counts = CachedCount('cart:count', _count_cart_items)
@@ -0,0 +1,115 @@
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from products.models import Product
+from .models import CartItem
+from .cache import cart_counts
+
+HEADER = 'X-Cart-Token'
+SALT = 'cart.guest'
+# Writers take a short lock in the cache; a crashed one holds it for LOCK_TIMEOUT at most
+LOCK_TIMEOUT = 5
+
+
+class GuestCartBusy(Exception):
+    pass
+
+
+class GuestCart:
+    """
+    An anonymous shopper's cart, kept in the cache as {product_id: quantity}
+    under a signed token. Nothing is written to the database until the
+    shopper logs in or registers and the cart is merged into CartItem.
+
+    The token's age is checked against GUEST_CART_TTL, and every write hands
+    out a freshly signed one, so a cart in use never expires.
+    """
+
+    def __init__(self, cart_id):
+        self.cart_id = cart_id
+        self.key = f'guest-cart:{cart_id}'
+
+    @classmethod
+    def create(cls):
+        cart = cls(uuid.uuid4().hex)
+        return cart.token(), cart
+
+    def token(self):
+        return signing.dumps(self.cart_id, salt=SALT)
+
+    @classmethod
+    def from_token(cls, token):
+        """Return the cart for `token`, or None if it is missing, forged or expired."""
+        if not token:
+            return None
+        try:
+            return cls(signing.loads(token, salt=SALT, max_age=settings.GUEST_CART_TTL))
+        except signing.BadSignature:
+            return None
+
+    @classmethod
+    def from_request(cls, request):
+        return cls.from_token(request.headers.get(HEADER))
+
+    def items(self):
+        return cache.get(self.key, {})
+
+    def save(self, items):
+        cache.set(self.key, items, settings.GUEST_CART_TTL)
+
+    @contextmanager
+    def edit(self):
+        """
+        Yield the items for a read-modify-write and save them afterwards,
+        holding a cache lock so concurrent writes to the cart don't lose
+        each other. Raises GuestCartBusy right away if another writer holds
+        the lock, rather than keeping a request worker waiting for it, and
+        also if this writer outlived LOCK_TIMEOUT and lost the lock.
+
+        The lock holds a random owner value, and only the owner saves or
+        releases it. The cache API has no compare-and-delete, so the check
+        and the delete are two calls. A lock that expires in between can
+        still be dropped, but only in that short gap, not for a writer's
+        whole overrun.
+        """
+        lock = f'{self.key}:lock'
+        owner = uuid.uuid4().hex
+        if not cache.add(lock, owner, LOCK_TIMEOUT):
+            raise GuestCartBusy()
+        try:
+            items = self.items()
+            yield items
+            if cache.get(lock) != owner:
+                raise GuestCartBusy()
+            self.save(items)
+        finally:
+            if cache.get(lock) == owner:
+                cache.delete(lock)
+
+    def delete(self):
+        cache.delete(self.key)
+
+
+def merge_guest_cart(request, user):
+    """
+    Move the guest cart named by the request's X-Cart-Token header (or a
+    `cart_token` field) into the user's CartItem rows with one bulk upsert.
+    """
+    guest_cart = GuestCart.from_token(request.headers.get(HEADER) or request.data.get('cart_token'))
+    if guest_cart is None:
+        return
+    try:
+        with guest_cart.edit() as items:
+            # Products may have been deleted since they were added
+            existing = set(Product.objects.filter(pk__in=list(items)).values_list('pk', flat=True))
+            CartItem.objects.bulk_add(user, {product_id: quantity for product_id, quantity in items.items() if product_id in existing})
+            items.clear()
+    except GuestCartBusy:
+        # Left for the next login rather than failing this one
+        return
+    guest_cart.delete()
+    cart_counts.invalidate(user.pk)
@@ -1,5 +1,70 @@
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
+from django.utils import timezone
+
+
+class CartItemManager(models.Manager):
+    def add(self, user, product_id, quantity):
+        """
+        Add `quantity` of a product to the user's cart with a single
+        INSERT ... ON CONFLICT DO UPDATE, so concurrent adds never lose an
+        increment. Returns the cart item id, or None if the product does not
+        exist or the line would go over CART_MAX_QUANTITY.
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        products = qn(self.model._meta.get_field('product').related_model._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        # Selecting from the product table makes a missing product insert
+        # nothing instead of failing a deferred foreign key at commit.
+        sql = (
+            f'INSERT INTO {table} ({qn("user_id")}, {qn("product_id")}, {qn("quantity")}, {qn("added_at")}, {qn("updated_at")}) '
+            f'SELECT %s, {qn("id")}, %s, %s, %s FROM {products} WHERE {qn("id")} = %s '
+            f'ON CONFLICT ({qn("user_id")}, {qn("product_id")}) DO UPDATE SET '
+            f'{qn("quantity")} = {table}.{qn("quantity")} + excluded.{qn("quantity")}, '
+            f'{qn("updated_at")} = excluded.{qn("updated_at")} '
+            f'WHERE {table}.{qn("quantity")} + excluded.{qn("quantity")} <= %s '
+            f'RETURNING {qn("id")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, quantity, now, now, product_id, settings.CART_MAX_QUANTITY])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def bulk_add(self, user, quantities):
+        """
+        Add every `{product_id: quantity}` to the user's cart with one
+        multi-row upsert. The product ids must already be known to exist,
+        and locked against deletion by the caller's transaction.
+        """
+        if not quantities:
+            return
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(quantities))
+        params = []
+        for product_id, quantity in quantities.items():
+            params += [user.pk, product_id, quantity, now, now]
+        sql = (
+            f'INSERT INTO {table} ({qn("user_id")}, {qn("product_id")}, {qn("quantity")}, {qn("added_at")}, {qn("updated_at")}) '
+            f'VALUES {values} '
+            f'ON CONFLICT ({qn("user_id")}, {qn("product_id")}) DO UPDATE SET '
+            f'{qn("quantity")} = {table}.{qn("quantity")} + excluded.{qn("quantity")}, '
+            f'{qn("updated_at")} = excluded.{qn("updated_at")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def bulk_set(self, user, quantities):
+        """Overwrite the quantity of every `{product_id: quantity}` in the user's cart."""
+        self.bulk_create(
+            [self.model(user=user, product_id=product_id, quantity=quantity) for product_id, quantity in quantities.items()],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+
 
 class CartItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart_items')
@@ -8,6 +73,8 @@ class CartItem(models.Model):
     added_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemManager()
+
     class Meta:
         unique_together = ('user', 'product')
 
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .cache import cart_counts
+from .models import CartItem
+
+
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart_count(sender, instance, **kwargs):
+    # Also covers rows removed by a product or user cascade
+    cart_counts.invalidate(instance.user_id)
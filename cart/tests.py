@@ -1,16 +1,25 @@
+import time
+from unittest import mock
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from accounts.models import User
 from products.models import Product
 from categories.models import Category
+from orders.models import Order, OrderProduct
+from .cache import cart_counts
 from .models import CartItem
+from . import guest
 
 # Create your tests here.
 
 class CartAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass')
         self.category = Category.objects.create(name='Tech', description='Tech category')
         self.product = Product.objects.create(
@@ -30,6 +39,72 @@ class CartAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(CartItem.objects.filter(user=self.user, product=self.product).exists())
 
+    def test_add_to_cart_accumulates(self):
+        """Check if adding a product twice adds the quantities in one row"""
+        self.client.login(username='buyer', password='buyerpass')
+        url = reverse('cart-add', args=[self.product.id])
+        self.client.post(url, {'quantity': 2})
+        response = self.client.post(url, {'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['quantity'], 5)
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.product).quantity, 5)
+
+    def test_add_to_cart_missing_product(self):
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.post(reverse('cart-add', args=[self.product.id + 100]), {'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_add_to_cart_invalid_quantity(self):
+        self.client.login(username='buyer', password='buyerpass')
+        url = reverse('cart-add', args=[self.product.id])
+        self.assertEqual(self.client.post(url, {'quantity': 'many'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'quantity': 0}).status_code, 400)
+
+    @override_settings(CART_MAX_QUANTITY=5)
+    def test_add_to_cart_quantity_limit(self):
+        """Check if a cart line cannot grow past CART_MAX_QUANTITY"""
+        self.client.login(username='buyer', password='buyerpass')
+        url = reverse('cart-add', args=[self.product.id])
+        self.assertEqual(self.client.post(url, {'quantity': 2 ** 40}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'quantity': 4}).status_code, 201)
+        self.assertEqual(self.client.post(url, {'quantity': 2}).status_code, 400)
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.product).quantity, 4)
+
+    def test_batch_cart(self):
+        """Check if a batch of add/set/remove operations is applied in order"""
+        other = Product.objects.create(name='Case', description='A case', price=10.00, quantity=10,
+                                       category=self.category, seller=self.user)
+        third = Product.objects.create(name='Cable', description='A cable', price=5.00, quantity=10,
+                                       category=self.category, seller=self.user)
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+        CartItem.objects.create(user=self.user, product=third, quantity=1)
+        self.client.login(username='buyer', password='buyerpass')
+        operations = [
+            {'op': 'add', 'product_id': self.product.id, 'quantity': 2},
+            {'op': 'set', 'product_id': other.id, 'quantity': 4},
+            {'op': 'add', 'product_id': other.id, 'quantity': 1},
+            {'op': 'remove', 'product_id': third.id},
+        ]
+        response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data}
+        self.assertEqual(quantities, {self.product.id: 3, other.id: 5})
+
+    def test_batch_cart_rejects_unknown_products(self):
+        """Check if a batch with an unknown product changes nothing"""
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+        self.client.login(username='buyer', password='buyerpass')
+        operations = [
+            {'op': 'remove', 'product_id': self.product.id},
+            {'op': 'add', 'product_id': self.product.id + 100},
+        ]
+        response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(user=self.user).exists())
+        response = self.client.post(reverse('cart-batch'), {'operations': [{'op': 'drop'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
     def test_list_cart(self):
         self.client.login(username='buyer', password='buyerpass')
         CartItem.objects.create(user=self.user, product=self.product, quantity=1)
@@ -38,6 +113,77 @@ class CartAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_list_cart_query_count(self):
+        """Check if listing the cart is a single query"""
+        for i in range(3):
+            product = Product.objects.create(name=f'Item {i}', description='Item', price=1.00,
+                                             quantity=1, category=self.category, seller=self.user)
+            CartItem.objects.create(user=self.user, product=product, quantity=1)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-list'))
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]['product']['seller'], 'buyer')
+
+    def test_cart_summary(self):
+        """Check if the summary totals the cart per seller in one query"""
+        other_seller = User.objects.create(username='other-seller')
+        other = Product.objects.create(name='Case', description='A case', price=12.25, quantity=10,
+                                       category=self.category, seller=other_seller)
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        CartItem.objects.create(user=self.user, product=other, quantity=3)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart-summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 5)
+        self.assertEqual(response.data['total'], '1036.75')
+        self.assertEqual([(s['seller'], s['item_count'], s['subtotal']) for s in response.data['sellers']],
+                         [('buyer', 2, '1000.00'), ('other-seller', 3, '36.75')])
+
+    def test_cart_count_is_cached_and_invalidated(self):
+        """Check if the badge count is served from the cache until the cart changes"""
+        self.client.force_authenticate(self.user)
+        url = reverse('cart-count')
+        self.assertEqual(self.client.get(url).data['count'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['count'], 0)
+        # The count is dropped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('cart-add', args=[self.product.id]), {'quantity': 3})
+        self.assertEqual(self.client.get(url).data['count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('cart-remove', args=[self.product.id]))
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+    def test_cart_count_stale_reader_not_served(self):
+        """Check if a count read before a write commits, but stored after, is never served"""
+        url = reverse('cart-count')
+        self.client.force_authenticate(self.user)
+        compute = cart_counts.compute
+
+        def slow_count(user_id):
+            # Another request commits a cart write while this one is counting
+            value = compute(user_id)
+            CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+            with self.captureOnCommitCallbacks(execute=True):
+                cart_counts.invalidate(self.user.pk)
+            return value
+
+        with mock.patch.object(cart_counts, 'compute', slow_count):
+            self.assertEqual(self.client.get(url).data['count'], 0)
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+    def test_cart_count_invalidated_by_product_delete(self):
+        """Check if a product delete cascading into the cart refreshes the badge count"""
+        self.client.force_authenticate(self.user)
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        url = reverse('cart-count')
+        self.assertEqual(self.client.get(url).data['count'], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
     def test_clear_cart(self):
         self.client.login(username='buyer', password='buyerpass')
         CartItem.objects.create(user=self.user, product=self.product, quantity=1)
@@ -54,6 +200,137 @@ class CartAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 204)
         self.assertFalse(CartItem.objects.filter(user=self.user, product=self.product).exists())
 
+    def fill_cart(self, sellers, items_per_seller):
+        for s in range(sellers):
+            seller = User.objects.create(username=f'seller{s}-{items_per_seller}')
+            for i in range(items_per_seller):
+                product = Product.objects.create(name=f'Item {s}-{i}', description='Item', price=2.50,
+                                                 quantity=10, category=self.category, seller=seller)
+                CartItem.objects.create(user=self.user, product=product, quantity=2)
+
+    def test_checkout(self):
+        """Check if checkout places one order per seller and empties the cart"""
+        self.fill_cart(sellers=3, items_per_seller=2)
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.post(reverse('cart-checkout'), {'paymentMethod': 'CARD'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual({order['totalPrice'] for order in response.data}, {'10.00'})
+        self.assertEqual(OrderProduct.objects.filter(order__user=self.user).count(), 6)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+        self.assertEqual(set(Product.objects.exclude(pk=self.product.pk).values_list('quantity', flat=True)), {8})
+
+    def test_checkout_insufficient_stock(self):
+        """Check if checkout places nothing when a product is short"""
+        CartItem.objects.create(user=self.user, product=self.product, quantity=6)
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.post(reverse('cart-checkout'))
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.assertTrue(CartItem.objects.filter(user=self.user).exists())
+
+    def test_checkout_empty_cart(self):
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.post(reverse('cart-checkout'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_checkout_query_count_independent_of_cart_size(self):
+        """Check if a 100 item cart across 20 sellers costs the same queries as a single item"""
+        self.client.force_authenticate(self.user)
+        counts = []
+        for sellers, items_per_seller in ((1, 1), (20, 5)):
+            self.fill_cart(sellers, items_per_seller)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('cart-checkout'))
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data), sellers)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_guest_cart_add_and_list(self):
+        """Check if anonymous shoppers can fill a guest cart with its token"""
+        response = self.client.post(reverse('guest-cart'))
+        self.assertEqual(response.status_code, 201)
+        token = response.data['token']
+        url = reverse('guest-cart-add', args=[self.product.id])
+        self.client.post(url, {'quantity': 2}, HTTP_X_CART_TOKEN=token)
+        self.client.post(url, {'quantity': 1}, HTTP_X_CART_TOKEN=token)
+        response = self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertEqual(response.data['items'][0]['quantity'], 3)
+        self.assertFalse(CartItem.objects.exists())
+
+    @override_settings(CART_MAX_QUANTITY=5)
+    def test_batch_cart_quantity_limit(self):
+        """Check if a batch cannot grow a cart line past CART_MAX_QUANTITY"""
+        CartItem.objects.create(user=self.user, product=self.product, quantity=4)
+        self.client.login(username='buyer', password='buyerpass')
+        operations = [{'op': 'add', 'product_id': self.product.id, 'quantity': 2}]
+        response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['products'], [self.product.id])
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.product).quantity, 4)
+        operations = [{'op': 'set', 'product_id': self.product.id, 'quantity': 2 ** 40}]
+        response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_guest_cart_rejects_forged_token(self):
+        """Check if a tampered cart token is refused"""
+        token = self.client.post(reverse('guest-cart')).data['token']
+        response = self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=token + 'x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_guest_cart_token_slides_on_write(self):
+        """Check if a write renews the guest cart token so an active cart does not expire"""
+        url = reverse('guest-cart-add', args=[self.product.id])
+        now = time.time()
+        with self.settings(GUEST_CART_TTL=100), mock.patch('django.core.signing.time.time') as clock:
+            clock.return_value = now
+            token = self.client.post(reverse('guest-cart')).data['token']
+            clock.return_value = now + 90
+            renewed = self.client.post(url, {'quantity': 1}, HTTP_X_CART_TOKEN=token)
+            self.assertEqual(renewed['X-Cart-Token'], renewed.data['token'])
+            clock.return_value = now + 150
+            self.assertEqual(self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=token).status_code, 400)
+            response = self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=renewed.data['token'])
+            self.assertEqual(response.data['items'][0]['quantity'], 1)
+
+    def test_guest_cart_write_waits_for_lock(self):
+        """Check if a guest cart write is refused while another holds the cart"""
+        token = self.client.post(reverse('guest-cart')).data['token']
+        cart = guest.GuestCart.from_token(token)
+        url = reverse('guest-cart-add', args=[self.product.id])
+        with cart.edit() as items:
+            items[self.product.id] = 5
+            self.assertEqual(self.client.post(url, {'quantity': 1}, HTTP_X_CART_TOKEN=token).status_code, 409)
+        self.client.post(url, {'quantity': 1}, HTTP_X_CART_TOKEN=token)
+        self.assertEqual(cart.items(), {self.product.id: 6})
+
+    def test_guest_cart_overrun_writer_keeps_off(self):
+        """Check if a writer whose lock expired neither saves nor releases the next holder's lock"""
+        token = self.client.post(reverse('guest-cart')).data['token']
+        cart = guest.GuestCart.from_token(token)
+        lock = f'{cart.key}:lock'
+        with self.assertRaises(guest.GuestCartBusy):
+            with cart.edit() as items:
+                items[self.product.id] = 5
+                # The lock times out and another writer takes it
+                cache.set(lock, 'next-writer')
+        self.assertEqual(cart.items(), {})
+        self.assertEqual(cache.get(lock), 'next-writer')
+
+    def test_guest_cart_merged_on_login(self):
+        """Check if logging in moves the guest cart into the user's cart"""
+        CartItem.objects.create(user=self.user, product=self.product, quantity=1)
+        token = self.client.post(reverse('guest-cart')).data['token']
+        self.client.post(reverse('guest-cart-add', args=[self.product.id]), {'quantity': 2}, HTTP_X_CART_TOKEN=token)
+        response = self.client.post(reverse('login'), {'username': 'buyer', 'password': 'buyerpass'}, HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.get(user=self.user, product=self.product).quantity, 3)
+        response = self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data['items'], [])
+
     def test_permission_required_for_add(self):
         url = reverse('cart-add', args=[self.product.id])
         response = self.client.post(url, {'quantity': 1})
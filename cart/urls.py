@@ -5,5 +5,12 @@ urlpatterns = [
     path('<int:product_id>/', views.add_to_cart, name='cart-add'),  # POST /api/v1/Cart/:ProductId
     path('', views.list_cart, name='cart-list'),  # GET /api/v1/Cart/
     path('clear/', views.clear_cart, name='cart-clear'),  # PUT /api/v1/Cart/clear
+    path('checkout/', views.checkout, name='cart-checkout'),  # POST /api/v1/Cart/checkout
+    path('batch/', views.batch_cart, name='cart-batch'),  # POST /api/v1/Cart/batch
+    path('summary/', views.cart_summary, name='cart-summary'),  # GET /api/v1/Cart/summary
+    path('count/', views.cart_count, name='cart-count'),  # GET /api/v1/Cart/count
+    path('guest/', views.guest_cart, name='guest-cart'),  # GET, POST /api/v1/Cart/guest
+    path('guest/<int:product_id>/', views.add_to_guest_cart, name='guest-cart-add'),  # POST /api/v1/Cart/guest/:ProductId
+    path('guest/<int:product_id>/delete/', views.remove_from_guest_cart, name='guest-cart-remove'),  # DELETE /api/v1/Cart/guest/:ProductId
     path('<int:product_id>/delete/', views.remove_from_cart, name='cart-remove'),  # DELETE /api/v1/Cart/:ProductId
 ] 
\ No newline at end of file
@@ -1,31 +1,117 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
 from django.shortcuts import render
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from idempotency.decorators import idempotent
 from .models import CartItem
 from .serializers import CartItemSerializer
+from .cache import cart_counts
+from .guest import HEADER, GuestCart, GuestCartBusy
 from products.models import Product
+from products.serializers import ProductSerializer
+from orders.models import Order, OrderProduct
+from orders.serializers import OrderSerializer
+from orders.inventory import InsufficientStock, reserve_stock
 
 # Create your views here.
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def add_to_cart(request, product_id):
-    quantity = request.data.get('quantity', 1)
     try:
-        product = Product.objects.get(pk=product_id)
-    except Product.DoesNotExist:
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return Response({'detail': 'Invalid quantity.'}, status=status.HTTP_400_BAD_REQUEST)
+    if quantity <= 0 or quantity > settings.CART_MAX_QUANTITY:
+        return Response({'detail': 'Invalid quantity.'}, status=status.HTTP_400_BAD_REQUEST)
+    cart_item_id = CartItem.objects.add(request.user, product_id, quantity)
+    if cart_item_id is None:
+        if Product.objects.filter(pk=product_id).exists():
+            return Response({'detail': f'A cart line holds at most {settings.CART_MAX_QUANTITY}.'}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
-    cart_item, created = CartItem.objects.get_or_create(user=request.user, product=product)
-    if not created:
-        cart_item.quantity += int(quantity)
-    else:
-        cart_item.quantity = int(quantity)
-    cart_item.save()
+    cart_counts.invalidate(request.user.pk)
+    cart_item = CartItemSerializer.setup_eager_loading(CartItem.objects.all()).get(pk=cart_item_id)
     serializer = CartItemSerializer(cart_item)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+def _plan_cart_operations(operations):
+    """
+    Collapse a list of {op, product_id, quantity} operations, applied in
+    order, into one final action per product: ('add', n), ('set', n) or
+    ('remove', None). Returns (plan, errors).
+    """
+    plan = {}
+    errors = []
+    for index, operation in enumerate(operations):
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+            quantity = int(operation.get('quantity', 1))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            errors.append({'index': index, 'detail': 'Each operation needs an op and a numeric product_id and quantity.'})
+            continue
+        if op not in ('add', 'set', 'remove') or (op != 'remove' and not 0 < quantity <= settings.CART_MAX_QUANTITY):
+            errors.append({'index': index, 'detail': 'Invalid op or quantity.'})
+            continue
+        action, current = plan.get(product_id, (None, 0))
+        if op == 'remove':
+            plan[product_id] = ('remove', None)
+        elif op == 'set':
+            plan[product_id] = ('set', quantity)
+        elif action == 'remove':
+            plan[product_id] = ('set', quantity)
+        else:
+            plan[product_id] = (action or 'add', current + quantity)
+    return plan, errors
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def batch_cart(request):
+    operations = request.data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return Response({'detail': 'Operations list is required and cannot be empty.'}, status=status.HTTP_400_BAD_REQUEST)
+    plan, errors = _plan_cart_operations(operations)
+    if errors:
+        return Response({'detail': 'Invalid operations.', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    adds = {product_id: quantity for product_id, (action, quantity) in plan.items() if action == 'add'}
+    sets = {product_id: quantity for product_id, (action, quantity) in plan.items() if action == 'set'}
+    removes = [product_id for product_id, (action, _) in plan.items() if action == 'remove']
+    wanted = set(adds) | set(sets)
+    with transaction.atomic():
+        # Locked so none of them can be deleted before the upserts reference them
+        found = Product.objects.select_for_update(no_key=True).filter(pk__in=wanted).order_by('pk').values_list('pk', flat=True)
+        missing = wanted - set(found)
+        if missing:
+            return Response({'detail': 'Products not found.', 'products': sorted(missing)}, status=status.HTTP_404_NOT_FOUND)
+        current = dict(
+            CartItem.objects.select_for_update().filter(user=request.user, product_id__in=adds)
+            .order_by('pk').values_list('product_id', 'quantity')
+        )
+        over = [product_id for product_id, quantity in adds.items() if current.get(product_id, 0) + quantity > settings.CART_MAX_QUANTITY]
+        over += [product_id for product_id, quantity in sets.items() if quantity > settings.CART_MAX_QUANTITY]
+        if over:
+            return Response(
+                {'detail': f'A cart line holds at most {settings.CART_MAX_QUANTITY}.', 'products': sorted(over)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if removes:
+            CartItem.objects.filter(user=request.user, product_id__in=removes).delete()
+        CartItem.objects.bulk_set(request.user, sets)
+        CartItem.objects.bulk_add(request.user, adds)
+    cart_counts.invalidate(request.user.pk)
+    cart_items = CartItem.objects.filter(user=request.user)
+    serializer = CartItemSerializer(cart_items, many=True)
+    return Response(serializer.data)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_cart(request):
@@ -33,10 +119,45 @@ def list_cart(request):
     serializer = CartItemSerializer(cart_items, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_summary(request):
+    # One grouped query: item count and subtotal per seller
+    sellers = (
+        CartItem.objects.filter(user=request.user)
+        .values('product__seller_id', 'product__seller__username')
+        .annotate(
+            item_count=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        )
+        .order_by('product__seller_id')
+    )
+    sellers = [
+        {
+            'seller_id': row['product__seller_id'],
+            'seller': row['product__seller__username'],
+            'item_count': row['item_count'],
+            'subtotal': row['subtotal'],
+        }
+        for row in sellers
+    ]
+    total = sum((row['subtotal'] for row in sellers), Decimal('0'))
+    return Response({
+        'item_count': sum(row['item_count'] for row in sellers),
+        'sellers': [dict(row, subtotal=f"{row['subtotal']:.2f}") for row in sellers],
+        'total': f'{total:.2f}',
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cart_count(request):
+    return Response({'count': cart_counts.get(request.user.pk)})
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def clear_cart(request):
     CartItem.objects.filter(user=request.user).delete()
+    cart_counts.invalidate(request.user.pk)
     return Response({'detail': 'Cart cleared.'}, status=status.HTTP_200_OK)
 
 @api_view(['DELETE'])
@@ -47,4 +168,111 @@ def remove_from_cart(request, product_id):
     except CartItem.DoesNotExist:
         return Response({'detail': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
     cart_item.delete()
+    cart_counts.invalidate(request.user.pk)
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def checkout(request):
+    payment_method = request.data.get('paymentMethod', 'COD')
+    try:
+        with transaction.atomic():
+            # Lock the cart so a retried checkout cannot order it twice
+            locked = list(CartItem.objects.select_for_update().filter(user=request.user).values_list('pk', 'product_id', 'quantity'))
+            quantities = {product_id: quantity for _, product_id, quantity in locked}
+            if not quantities:
+                return Response({'detail': 'Cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+            products = reserve_stock(quantities)
+
+            # One order per seller
+            lines_by_seller = defaultdict(list)
+            for product_id, quantity in quantities.items():
+                product = products[product_id]
+                lines_by_seller[product.seller_id].append((product, quantity))
+            orders = Order.objects.bulk_create([
+                Order(
+                    user=request.user,
+                    seller_id=seller_id,
+                    totalPrice=sum(product.price * quantity for product, quantity in lines),
+                    paymentMethod=payment_method,
+                )
+                for seller_id, lines in lines_by_seller.items()
+            ])
+            OrderProduct.objects.bulk_create([
+                OrderProduct(order=order, product=product, quantity=quantity)
+                for order, lines in zip(orders, lines_by_seller.values())
+                for product, quantity in lines
+            ])
+            # Only what was ordered; an item added since the lock stays in the cart
+            CartItem.objects.filter(pk__in=[pk for pk, _, _ in locked]).delete()
+    except InsufficientStock as e:
+        return Response({'detail': 'Insufficient stock.', 'products': e.product_ids}, status=status.HTTP_409_CONFLICT)
+    cart_counts.invalidate(request.user.pk)
+    orders = Order.objects.filter(pk__in=[order.pk for order in orders]).order_by('pk')
+    serializer = OrderSerializer(orders, many=True)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+def _guest_cart_response(items, token=None, status_code=status.HTTP_200_OK):
+    products = ProductSerializer.setup_eager_loading(Product.objects.all()).in_bulk(list(items))
+    data = {
+        'items': [
+            {'product': ProductSerializer(products[product_id]).data, 'quantity': quantity}
+            for product_id, quantity in items.items() if product_id in products
+        ],
+    }
+    if token is not None:
+        data['token'] = token
+    return Response(data, status=status_code, headers={HEADER: token} if token is not None else None)
+
+@api_view(['GET', 'POST'])
+@permission_classes([AllowAny])
+def guest_cart(request):
+    # POST starts a new guest cart and returns its token
+    if request.method == 'POST':
+        token, _ = GuestCart.create()
+        return _guest_cart_response({}, token=token, status_code=status.HTTP_201_CREATED)
+    cart = GuestCart.from_request(request)
+    if cart is None:
+        return Response({'detail': 'Invalid or expired cart token.'}, status=status.HTTP_400_BAD_REQUEST)
+    return _guest_cart_response(cart.items())
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def add_to_guest_cart(request, product_id):
+    cart = GuestCart.from_request(request)
+    if cart is None:
+        return Response({'detail': 'Invalid or expired cart token.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        quantity = int(request.data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return Response({'detail': 'Invalid quantity.'}, status=status.HTTP_400_BAD_REQUEST)
+    if quantity <= 0 or quantity > settings.CART_MAX_QUANTITY:
+        return Response({'detail': 'Invalid quantity.'}, status=status.HTTP_400_BAD_REQUEST)
+    if not Product.objects.filter(pk=product_id).exists():
+        return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        with cart.edit() as items:
+            if product_id not in items and len(items) >= settings.GUEST_CART_MAX_ITEMS:
+                return Response({'detail': 'Guest cart is full.'}, status=status.HTTP_400_BAD_REQUEST)
+            if items.get(product_id, 0) + quantity > settings.CART_MAX_QUANTITY:
+                return Response({'detail': f'A cart line holds at most {settings.CART_MAX_QUANTITY}.'}, status=status.HTTP_400_BAD_REQUEST)
+            items[product_id] = items.get(product_id, 0) + quantity
+    except GuestCartBusy:
+        return Response({'detail': 'Guest cart is busy, try again.'}, status=status.HTTP_409_CONFLICT)
+    # Every write renews the token, see cart.guest
+    return _guest_cart_response(items, token=cart.token(), status_code=status.HTTP_201_CREATED)
+
+@api_view(['DELETE'])
+@permission_classes([AllowAny])
+def remove_from_guest_cart(request, product_id):
+    cart = GuestCart.from_request(request)
+    if cart is None:
+        return Response({'detail': 'Invalid or expired cart token.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with cart.edit() as items:
+            if items.pop(product_id, None) is None:
+                return Response({'detail': 'Item not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+    except GuestCartBusy:
+        return Response({'detail': 'Guest cart is busy, try again.'}, status=status.HTTP_409_CONFLICT)
+    return Response(status=status.HTTP_204_NO_CONTENT, headers={HEADER: cart.token()})
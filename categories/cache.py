@@ -0,0 +1,15 @@
+from commerce.cache import DocumentCache
+
+from .models import Category
+from .serializers import CategorySerializer
+
+
+def _build_category_document(pk):
+    try:
+        category = Category.objects.get(pk=pk)
+    except Category.DoesNotExist:
+        return None
+    return category.updated_at, CategorySerializer(category).data
+
+
+category_documents = DocumentCache('category', _build_category_document)
@@ -9,5 +9,22 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Delta sync, see commerce.changes
+            models.Index(fields=['updated_at', 'id'], name='category_updated_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class CategoryTombstone(models.Model):
+    """Records a deleted category's id for the changes feed, see commerce.changes."""
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='category_tombstone_deleted_idx'),
+        ]
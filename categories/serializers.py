@@ -1,10 +1,12 @@
 from rest_framework import serializers
+from commerce.serializers import EagerLoadingMixin
 from .models import Category
 
 
 # Create your serializers here.
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'imageCategory', 'created_at', 'updated_at'] 
\ No newline at end of file
+        fields = ['id', 'name', 'description', 'imageCategory', 'created_at', 'updated_at']
+        only = fields
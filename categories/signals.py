@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, CategoryTombstone
+from .cache import category_documents
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_document(sender, instance, **kwargs):
+    # Once committed, so a concurrent reader cannot cache the old row under the new version
+    pk = instance.pk
+    transaction.on_commit(lambda: category_documents.invalidate(pk))
+
+
+@receiver(post_delete, sender=Category)
+def record_deleted_category(sender, instance, **kwargs):
+    CategoryTombstone.objects.create(object_id=instance.pk)
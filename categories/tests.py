@@ -71,12 +71,27 @@ class CategoryAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 204)
         self.assertFalse(Category.objects.filter(id=self.category.id).exists())
 
+    def test_category_changes(self):
+        """Check if deleting a category shows up in both changes feeds"""
+        with self.settings(CHANGE_FEED_LAG=0):
+            categories = self.client.get(reverse('category-changes'))
+            products = self.client.get(reverse('product-changes'))
+            self.assertIn(self.category.id, [c['id'] for c in categories.data['changed']])
+            category_id = self.category.id
+            product_ids = list(Product.objects.filter(category=self.category).values_list('id', flat=True))
+
+            self.category.delete()
+            categories = self.client.get(reverse('category-changes'), {'since': categories.data['watermark']})
+            products = self.client.get(reverse('product-changes'), {'since': products.data['watermark']})
+        self.assertEqual(categories.data['deleted'], [category_id])
+        self.assertEqual(sorted(products.data['deleted']), sorted(product_ids))
+
     def test_list_category_products(self):
         """Check if users can list category products"""
         url = reverse('category-products', args=[self.category.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
 
     def test_permission_required_for_create(self):
         """Check if users can create categories"""
@@ -3,10 +3,15 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Category
+from .models import Category, CategoryTombstone
 from .serializers import CategorySerializer
+from .cache import category_documents
 from products.models import Product
 from products.serializers import ProductSerializer
+from products.pagination import ProductPagination
+from commerce.images import ImageError, store_image_value
+from commerce.conditional import add_validators, not_modified
+from commerce.changes import change_feed
 
 # Create your views here.
 
@@ -26,15 +31,18 @@ def list_categories(request):
     serializer = CategorySerializer(categories, many=True)
     return Response(serializer.data)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def category_changes(request):
+    return change_feed(request, Category.objects.all(), CategoryTombstone.objects.all(), CategorySerializer)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def retrieve_category(request, pk):
-    try:
-        category = Category.objects.get(pk=pk)
-    except Category.DoesNotExist:
+    document = category_documents.get(pk)
+    if document is None:
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = CategorySerializer(category)
-    return Response(serializer.data)
+    return not_modified(request, pk, document['updated_at']) or add_validators(Response(document['data']), pk, document['updated_at'])
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated, IsAdminUser])
@@ -56,7 +64,11 @@ def update_category_image(request, pk):
         category = Category.objects.get(pk=pk)
     except Category.DoesNotExist:
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    image = request.data.get('imageCategory')
+    # Accepts a multipart file, a data:image/...;base64 URI, or a file name
+    try:
+        image = store_image_value(request, 'imageCategory')
+    except ImageError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if not image:
         return Response({'detail': 'No image provided.'}, status=status.HTTP_400_BAD_REQUEST)
     category.imageCategory = image
@@ -82,5 +94,7 @@ def list_category_products(request, pk):
     except Category.DoesNotExist:
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
     products = Product.objects.filter(category=category)
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    paginator = ProductPagination()
+    page = paginator.paginate_queryset(ProductSerializer.setup_eager_loading(products), request)
+    serializer = ProductSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
@@ -0,0 +1,152 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+
+class DocumentCache:
+    """
+    Versioned read-through cache of rendered serializer output.
+
+    Every object has a version token stored under `<prefix>:<pk>:v`, and its
+    document is stored under `<prefix>:<pk>:<token>`. Invalidating an object
+    only replaces its token, so a reader that rendered a document from stale
+    rows writes it under a token nobody will ask for again.
+
+    `build(pk)` must return `(updated_at, data)`, or None if the object does
+    not exist. It may also return `(updated_at, data, scopes)`, naming shared
+    rows the document embeds (e.g. `category:3`). Each scope has a version
+    token too, the entry records the ones it was built under, and
+    `invalidate_scope()` retires every document of a scope with one write.
+    Hit and miss counters live in the cache so every worker reports into
+    the same totals.
+    """
+
+    def __init__(self, prefix, build):
+        self.prefix = prefix
+        self.build = build
+
+    @property
+    def cache(self):
+        return caches[settings.DOCUMENT_CACHE_ALIAS]
+
+    def version_key(self, pk):
+        return f'{self.prefix}:{pk}:v'
+
+    def scopes_key(self, pk):
+        return f'{self.prefix}:{pk}:scopes'
+
+    def scope_key(self, scope):
+        return f'{self.prefix}:scope:{scope}:v'
+
+    def _ensure_version(self, key, version):
+        if version is None:
+            version = uuid.uuid4().hex
+            if not self.cache.add(key, version, settings.DOCUMENT_CACHE_TIMEOUT):
+                version = self.cache.get(key, version)
+        return version
+
+    def get(self, pk):
+        """Return the cached `{'updated_at': ..., 'data': ...}` entry for `pk`."""
+        cache = self.cache
+        head = cache.get_many([self.version_key(pk), self.scopes_key(pk)])
+        version = head.get(self.version_key(pk))
+        scopes = head.get(self.scopes_key(pk), [])
+        scope_keys = [self.scope_key(scope) for scope in scopes]
+        # Scope versions are read before a rebuild, so one bumped mid-build leaves a dead entry
+        values = cache.get_many(scope_keys + ([f'{self.prefix}:{pk}:{version}'] if version else []))
+        scope_versions = {scope: self._ensure_version(key, values.get(key)) for scope, key in zip(scopes, scope_keys)}
+        if version is None:
+            version = self._ensure_version(self.version_key(pk), None)
+        else:
+            entry = values.get(f'{self.prefix}:{pk}:{version}')
+            if entry is not None and entry.get('scopes', {}) == scope_versions:
+                self.count('hits')
+                return entry
+
+        self.count('misses')
+        built = self.build(pk)
+        if built is None:
+            return None
+        built_scopes = list(built[2]) if len(built) > 2 else []
+        if built_scopes != scopes:
+            # First build, or the object moved to other scopes
+            cache.set(self.scopes_key(pk), built_scopes, settings.DOCUMENT_CACHE_TIMEOUT)
+            scope_versions = {
+                scope: self._ensure_version(self.scope_key(scope), cache.get(self.scope_key(scope)))
+                for scope in built_scopes
+            }
+        entry = {'updated_at': built[0], 'data': built[1], 'scopes': scope_versions}
+        cache.set(f'{self.prefix}:{pk}:{version}', entry, settings.DOCUMENT_CACHE_TIMEOUT)
+        return entry
+
+    def invalidate(self, *pks):
+        if pks:
+            self.cache.set_many(
+                {self.version_key(pk): uuid.uuid4().hex for pk in pks},
+                settings.DOCUMENT_CACHE_TIMEOUT,
+            )
+
+    def invalidate_scope(self, *scopes):
+        if scopes:
+            self.cache.set_many(
+                {self.scope_key(scope): uuid.uuid4().hex for scope in scopes},
+                settings.DOCUMENT_CACHE_TIMEOUT,
+            )
+
+    def count(self, name):
+        key = f'{self.prefix}:stats:{name}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, 1, timeout=None)
+
+    def stats(self):
+        values = self.cache.get_many([f'{self.prefix}:stats:hits', f'{self.prefix}:stats:misses'])
+        return {
+            'hits': values.get(f'{self.prefix}:stats:hits', 0),
+            'misses': values.get(f'{self.prefix}:stats:misses', 0),
+        }
+
+
+class CachedCount:
+    """
+    A per-user number (e.g. a badge count) kept in the default cache until a
+    write to the underlying rows calls `invalidate(user_id)`.
+
+    Like DocumentCache, each user has a version token, and the number is
+    stored together with the token it was computed under. Invalidating
+    replaces the token once the write commits, so a reader that counted the
+    old rows and stores its number late never has it served again.
+    """
+
+    def __init__(self, prefix, compute):
+        self.prefix = prefix
+        self.compute = compute
+
+    def key(self, user_id):
+        return f'{self.prefix}:{user_id}'
+
+    def version_key(self, user_id):
+        return f'{self.prefix}:{user_id}:v'
+
+    def get(self, user_id):
+        key, version_key = self.key(user_id), self.version_key(user_id)
+        values = cache.get_many([key, version_key])
+        version = values.get(version_key)
+        entry = values.get(key)
+        if version is not None and entry is not None and entry[0] == version:
+            return entry[1]
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(version_key, version, settings.COUNT_CACHE_TIMEOUT):
+                version = cache.get(version_key, version)
+        # Read before counting, so a write committed meanwhile leaves a dead entry
+        value = self.compute(user_id)
+        cache.set(key, (version, value), settings.COUNT_CACHE_TIMEOUT)
+        return value
+
+    def invalidate(self, user_id):
+        version_key = self.version_key(user_id)
+        transaction.on_commit(lambda: cache.set(version_key, uuid.uuid4().hex, settings.COUNT_CACHE_TIMEOUT))
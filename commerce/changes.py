@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+# Delta sync: GET <resource>/changes/?since=<watermark> returns the rows
+# updated and the ids deleted after the watermark, oldest first, and a new
+# watermark to send next time. Both lists are read off (updated_at, id) and
+# (deleted_at, id) indexes, so a sync costs O(changes), not O(catalog).
+#
+# Rows whose stamp is younger than CHANGE_FEED_LAG seconds are held back
+# until the next sync, so a transaction that commits a little after it
+# stamped its rows is not skipped. This is a hard limit: a row or tombstone
+# committed more than CHANGE_FEED_LAG after its stamp can land behind a
+# watermark already handed out, and is never sent to that client. Writers
+# of feed models must commit within the lag (see the setting).
+#
+# Only a row's own updated_at moves it up the feed, so feed serializers
+# must not embed other rows (e.g. a product's category name) that can
+# change on their own.
+#
+# Tombstones are purged after CHANGE_FEED_TOMBSTONE_RETENTION seconds (see
+# the purge_tombstones command). Each sync that reads every pending
+# tombstone moves the watermark's deleted position up to the settled time,
+# so only a client that has not synced for that long can hold a position
+# older than the retention; it gets 410 Gone and must start over without
+# ?since.
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class InvalidWatermark(ValueError):
+    pass
+
+
+def encode_watermark(updated, deleted):
+    payload = json.dumps({'u': updated, 'd': deleted}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_watermark(value):
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return [_position(payload['u']), _position(payload['d'])]
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise InvalidWatermark('Invalid watermark.')
+
+
+def _position(value):
+    stamp, pk = value
+    stamp = datetime.fromisoformat(stamp)
+    if timezone.is_naive(stamp):
+        raise ValueError
+    return [stamp, int(pk)]
+
+
+def _after(stamp_field, position):
+    stamp, pk = position
+    return Q(**{f'{stamp_field}__gt': stamp}) | Q(**{stamp_field: stamp, 'pk__gt': pk})
+
+
+def _dump(stamp, pk):
+    return [stamp.isoformat(), pk]
+
+
+def change_feed(request, queryset, tombstones, serializer_class):
+    """
+    Build the changes response for `queryset` (a model with updated_at) and
+    its `tombstones` queryset (object_id, deleted_at). Without ?since the
+    feed starts at the beginning of the live rows and skips past the
+    existing tombstones.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        return Response({'detail': 'Invalid limit.'}, status=status.HTTP_400_BAD_REQUEST)
+    since = request.query_params.get('since')
+    epoch = [datetime.min.replace(tzinfo=dt_timezone.utc), 0]
+    if since:
+        try:
+            updated_position, deleted_position = decode_watermark(since)
+        except InvalidWatermark as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        horizon = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_TOMBSTONE_RETENTION)
+        if deleted_position[0] < horizon:
+            return Response(
+                {'detail': 'Watermark is older than the kept deletions, sync again without since.'},
+                status=status.HTTP_410_GONE,
+            )
+    else:
+        updated_position = epoch
+        latest = tombstones.order_by('-deleted_at', '-pk').values_list('deleted_at', 'pk').first()
+        deleted_position = list(latest) if latest else epoch
+
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_LAG)
+    changed = list(
+        serializer_class.setup_eager_loading(queryset)
+        .filter(_after('updated_at', updated_position), updated_at__lte=settled)
+        .order_by('updated_at', 'pk')[:limit + 1]
+    )
+    deleted = list(
+        tombstones.filter(_after('deleted_at', deleted_position), deleted_at__lte=settled)
+        .order_by('deleted_at', 'pk')
+        .values_list('deleted_at', 'pk', 'object_id')[:limit + 1]
+    )
+    deleted_more = len(deleted) > limit
+    more = len(changed) > limit or deleted_more
+    changed, deleted = changed[:limit], deleted[:limit]
+
+    if changed:
+        updated_position = [changed[-1].updated_at, changed[-1].pk]
+    if deleted:
+        deleted_position = list(deleted[-1][:2])
+    if not deleted_more and deleted_position < [settled, 0]:
+        # Every tombstone up to the settled time has been sent
+        deleted_position = [settled, 0]
+    return Response({
+        'changed': serializer_class(changed, many=True).data,
+        'deleted': [object_id for _, _, object_id in deleted],
+        'watermark': encode_watermark(_dump(*updated_position), _dump(*deleted_position)),
+        'more': more,
+    })
@@ -0,0 +1,35 @@
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+# Conditional GET for detail endpoints. A representation is identified by
+# its primary key and the `updated_at` of the newest row it is built from,
+# so views can answer If-None-Match / If-Modified-Since from a cached stamp
+# or a one-column probe before anything is serialized.
+
+
+def make_etag(pk, updated_at):
+    return f'"{pk}-{int(updated_at.timestamp() * 1000000)}"'
+
+
+def _client_is_current(request, etag, updated_at):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags or f'W/{etag}' in etags
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and int(updated_at.timestamp()) <= if_modified_since
+
+
+def add_validators(response, pk, updated_at):
+    response['ETag'] = make_etag(pk, updated_at)
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    return response
+
+
+def not_modified(request, pk, updated_at):
+    """Return a 304 response if the client's copy of `pk` is current, else None."""
+    if not _client_is_current(request, make_etag(pk, updated_at), updated_at):
+        return None
+    return add_validators(Response(status=status.HTTP_304_NOT_MODIFIED), pk, updated_at)
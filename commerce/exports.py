@@ -0,0 +1,127 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from accounts.models import User
+from orders.models import Order
+from products.models import Product
+from reviews.models import Review
+
+# Streaming exports for reporting. Rows are read with values_list() through
+# QuerySet.iterator(chunk_size), which uses a server-side cursor on
+# PostgreSQL, and written out one line at a time as NDJSON or CSV, so memory
+# stays flat however many rows there are. ?output= picks the format, since
+# ?format= is taken by DRF's renderer negotiation.
+
+OUTPUTS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Export:
+    """
+    A flat table over `model`: the `columns` passed to values_list() (also
+    the CSV header and NDJSON keys) and the query parameters that may filter
+    it, mapped to their lookup and the function that parses their value.
+    """
+
+    def __init__(self, model, columns, filters=None):
+        self.model = model
+        self.columns = columns
+        self.filters = filters or {}
+
+    def queryset(self, params):
+        lookups = {}
+        for name, (lookup, parse) in self.filters.items():
+            if params.get(name):
+                try:
+                    lookups[lookup] = parse(params[name])
+                except ValueError:
+                    raise ExportError(f'Invalid {name}.')
+        # Ordered by the primary key so every page of the cursor walks the same index
+        return self.model.objects.filter(**lookups).order_by('pk').values_list(*self.columns)
+
+    def rows(self, params):
+        return self.queryset(params).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+EXPORTS = {
+    'orders': Export(
+        Order,
+        ['id', 'user_id', 'user__username', 'seller_id', 'seller__username', 'totalPrice', 'paymentMethod', 'status',
+         'created_at', 'updated_at'],
+        {'status': ('status', str), 'user': ('user_id', int), 'seller': ('seller_id', int)},
+    ),
+    'reviews': Export(
+        Review,
+        ['id', 'product_id', 'product__name', 'user_id', 'user__username', 'rating', 'review', 'created_at', 'updated_at'],
+        {'product': ('product_id', int), 'user': ('user_id', int), 'rating': ('rating', int)},
+    ),
+    'products': Export(
+        Product,
+        ['id', 'name', 'description', 'price', 'quantity', 'category_id', 'category__name', 'seller_id', 'seller__username',
+         'imageProduct', 'rating_avg', 'rating_count', 'created_at', 'updated_at'],
+        {'category': ('category_id', int), 'seller': ('seller_id', int)},
+    ),
+    # Never passwords or reset codes
+    'users': Export(
+        User,
+        ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'phoneNumber', 'storeName', 'isVerified', 'IsActive',
+         'is_staff', 'date_joined', 'last_login'],
+        {'role': ('role', str)},
+    ),
+}
+
+
+class _Echo:
+    # csv.writer only needs write(); hand each formatted line straight back
+    def write(self, value):
+        return value
+
+
+def render_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def render_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+RENDERERS = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def render_export(name, output, params):
+    """Return an iterator of text lines for export `name` in `output` format."""
+    if output not in RENDERERS:
+        raise ExportError(f'Invalid output. Choose one of: {", ".join(RENDERERS)}.')
+    export = EXPORTS[name]
+    return RENDERERS[output](export.columns, export.rows(params))
+
+
+def export_response(request, name):
+    """Stream export `name` for an API request, with ?output=ndjson|csv and the export's filters."""
+    output = request.query_params.get('output', 'ndjson')
+    try:
+        lines = render_export(name, output, request.query_params)
+    except ExportError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(lines, content_type=OUTPUTS[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
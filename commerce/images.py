@@ -0,0 +1,183 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed image storage under MEDIA_ROOT/images.
+#
+# An image is stored once under the SHA-256 of its bytes (its key,
+# `<sha256>.<ext>`), so the same picture uploaded twice takes no extra
+# space. Models keep its name relative to MEDIA_ROOT in their image fields,
+# `images/ab/cd/<key>`, the same kind of value as the older plain file
+# names: MEDIA_URL plus the name (default_storage.url()) is its URL. Uploads are streamed to a
+# temporary file chunk by chunk while they are hashed, and the type comes
+# from the file's first bytes rather than its name or a full decode.
+
+SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'\xff\xd8\xff': 'jpg',
+}
+SNIFF_BYTES = max(map(len, SIGNATURES))
+DATA_URI_CHUNK = 64 * 1024  # base64 characters decoded at a time, a multiple of 4
+
+
+class ImageError(ValueError):
+    pass
+
+
+def image_root():
+    return os.path.join(settings.MEDIA_ROOT, 'images')
+
+
+def image_name(key):
+    # Two levels of fan-out keep directories small
+    return f'images/{key[:2]}/{key[2:4]}/{key}'
+
+
+def image_path(key):
+    return os.path.join(settings.MEDIA_ROOT, *image_name(key).split('/'))
+
+
+def thumbnail_path(key, size):
+    return os.path.join(image_root(), 'thumbs', f'{size[0]}x{size[1]}', key[:2], key)
+
+
+def sniff(head):
+    for signature, extension in SIGNATURES.items():
+        if head.startswith(signature):
+            return extension
+    raise ImageError('Invalid image type. Only jpg, jpeg, png allowed.')
+
+
+def store_chunks(chunks):
+    """
+    Write an iterable of byte chunks to storage and return its name under
+    MEDIA_ROOT. Raises ImageError if it is not a PNG/JPEG or is larger than
+    IMAGE_MAX_SIZE.
+    """
+    os.makedirs(image_root(), exist_ok=True)
+    digest = hashlib.sha256()
+    extension, size, head = None, 0, b''
+    fd, temp_path = tempfile.mkstemp(dir=image_root(), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > settings.IMAGE_MAX_SIZE:
+                    raise ImageError(f'Image size exceeds {settings.IMAGE_MAX_SIZE // (1024 * 1024)}MB.')
+                if extension is None:
+                    # Refuse non-images as soon as enough bytes have arrived
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                    if len(head) == SNIFF_BYTES:
+                        extension = sniff(head)
+                temp.write(chunk)
+                digest.update(chunk)
+        if extension is None:
+            extension = sniff(head)
+
+        key = f'{digest.hexdigest()}.{extension}'
+        path = image_path(key)
+        if os.path.exists(path):
+            os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            schedule_thumbnails(key)
+        return image_name(key)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def store_upload(upload):
+    """Store a Django UploadedFile, reading it in chunks."""
+    if upload.size is not None and upload.size > settings.IMAGE_MAX_SIZE:
+        raise ImageError(f'Image size exceeds {settings.IMAGE_MAX_SIZE // (1024 * 1024)}MB.')
+    return store_chunks(upload.chunks())
+
+
+def _decode_data_uri(data):
+    for start in range(0, len(data), DATA_URI_CHUNK):
+        try:
+            yield base64.b64decode(data[start:start + DATA_URI_CHUNK], validate=True)
+        except binascii.Error:
+            raise ImageError('Invalid image data.')
+
+
+def store_data_uri(value):
+    """Store a `data:image/...;base64,` string, decoding it a slice at a time."""
+    header, separator, data = value.partition(';base64,')
+    if not separator or not header.startswith('data:image/'):
+        raise ImageError('Invalid image data.')
+    return store_chunks(_decode_data_uri(data))
+
+
+def store_image_value(request, field):
+    """
+    Return the value to save for an image field from a request: the stored
+    name of a multipart file or data URI in `field`, or the plain string
+    that was sent (an existing name). Returns None if nothing was sent.
+    """
+    upload = request.FILES.get(field)
+    if upload is not None:
+        return store_upload(upload)
+    value = request.data.get(field)
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ImageError('Invalid image data.')
+    if value.startswith('data:'):
+        return store_data_uri(value)
+    return value
+
+
+# Thumbnails are made on a small thread pool after the upload request has
+# returned; Pillow is optional and only imported there.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+        return _executor
+
+
+def schedule_thumbnails(key):
+    if settings.IMAGE_THUMBNAIL_SIZES:
+        return get_executor().submit(make_thumbnails, key)
+
+
+def make_thumbnails(key):
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning('Pillow is not installed, skipping thumbnails for %s', key)
+        return []
+    made = []
+    try:
+        with Image.open(image_path(key)) as image:
+            for size in settings.IMAGE_THUMBNAIL_SIZES:
+                path = thumbnail_path(key, size)
+                if os.path.exists(path):
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                thumbnail = image.copy()
+                thumbnail.thumbnail(size)
+                thumbnail.save(path, format='PNG' if key.endswith('.png') else 'JPEG')
+                made.append(path)
+    except Exception:
+        logger.exception('Could not make thumbnails for %s', key)
+    return made
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from commerce.exports import EXPORTS, RENDERERS, ExportError, render_export
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, reviews, products or users as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument(
+            '--output',
+            choices=sorted(RENDERERS),
+            default='ndjson',
+        )
+        parser.add_argument(
+            '--filter',
+            action='append',
+            default=[],
+            metavar='NAME=VALUE',
+            help='Same filters as the export endpoint, e.g. --filter status=Paid',
+        )
+        parser.add_argument(
+            '--file',
+            help='Write to this path instead of stdout',
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            name, separator, value = item.partition('=')
+            if not separator:
+                raise CommandError(f'Invalid filter "{item}", expected NAME=VALUE.')
+            params[name] = value
+        try:
+            lines = render_export(options['name'], options['output'], params)
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['file']:
+            with open(options['file'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
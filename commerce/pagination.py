@@ -0,0 +1,118 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination over a fixed sort key.
+
+    Each page is fetched with a `WHERE (key) > (last key seen)` filter instead
+    of an OFFSET, so every page costs the same no matter how deep it is. The
+    last field of every ordering must be unique (normally `id`) so the cursor
+    always points at exactly one row.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # name -> tuple of model fields, prefix with '-' for descending
+    orderings = {'newest': ('-created_at', '-id')}
+    default_ordering = 'newest'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            self.ordering_name = cursor['o']
+        else:
+            self.ordering_name = self.get_ordering_name(request)
+        self.ordering = self.orderings[self.ordering_name]
+
+        queryset = queryset.order_by(*self.ordering)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(queryset.model, cursor['k']))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering_name(self, request):
+        name = request.query_params.get(self.ordering_query_param)
+        if name in self.orderings:
+            return name
+        return self.default_ordering
+
+    def get_cursor_filter(self, model, values):
+        """
+        Expand a lexicographic `(a, b, c) > (x, y, z)` comparison into
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`, honouring
+        the direction of each field.
+        """
+        fields = [field.lstrip('-') for field in self.ordering]
+        try:
+            values = [model._meta.get_field(name).to_python(value) for name, value in zip(fields, values)]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{fields[i]}__{lookup}': values[i]})
+            for name, value in zip(fields[:i], values[:i]):
+                term &= Q(**{name: value})
+            condition |= term
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        key = [getattr(last, field.lstrip('-')) for field in self.ordering]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(key))
+
+    def encode_cursor(self, key):
+        payload = json.dumps({'o': self.ordering_name, 'k': key}, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            cursor = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if cursor['o'] not in self.orderings or len(cursor['k']) != len(self.orderings[cursor['o']]):
+                raise ValueError
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
@@ -0,0 +1,20 @@
+# Batched deletes for the housekeeping commands. One DELETE over every
+# expired row would hold its locks (and grow the transaction log) for as long
+# as it takes; here each batch is deleted on its own and committed before
+# the next is picked.
+
+
+def purge_in_batches(queryset, batch_size):
+    """
+    Delete the rows of `queryset` `batch_size` at a time and return how many
+    rows were deleted, cascades included. Rows go through the ORM, so the
+    delete signals still fire.
+    """
+    deleted = 0
+    while True:
+        # The queryset is re-evaluated each time, picking up the next batch's keys
+        batch = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        # Outside any transaction, delete() commits this batch on its own
+        deleted += queryset.model.objects.filter(pk__in=batch).delete()[0]
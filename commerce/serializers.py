@@ -0,0 +1,43 @@
+from django.db.models import QuerySet
+
+
+class EagerLoadingMixin:
+    """
+    Lets a ModelSerializer declare the rows it needs to render, next to the
+    fields that need them:
+
+        class Meta:
+            select_related = ['category', 'seller']
+            prefetch_related = [...]
+            only = ['id', 'name', 'category', 'category__name', ...]
+
+    `setup_eager_loading(queryset)` applies them, and passing an unevaluated
+    queryset with `many=True` applies them automatically, so a list renders in
+    a constant number of queries. Serializers that nest another one build
+    their declarations from `nested_select_related()`/`nested_only()`.
+    """
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        meta = cls.Meta
+        if getattr(meta, 'select_related', None):
+            queryset = queryset.select_related(*meta.select_related)
+        if getattr(meta, 'prefetch_related', None):
+            queryset = queryset.prefetch_related(*meta.prefetch_related)
+        if getattr(meta, 'only', None):
+            queryset = queryset.only(*meta.only)
+        return queryset
+
+    @classmethod
+    def nested_select_related(cls, prefix):
+        return [prefix] + [f'{prefix}__{name}' for name in getattr(cls.Meta, 'select_related', [])]
+
+    @classmethod
+    def nested_only(cls, prefix):
+        return [f'{prefix}__{name}' for name in getattr(cls.Meta, 'only', [])]
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        if args and isinstance(args[0], QuerySet) and args[0]._result_cache is None:
+            args = (cls.setup_eager_loading(args[0]),) + args[1:]
+        return super().many_init(*args, **kwargs)
@@ -43,6 +43,9 @@ INSTALLED_APPS = [
     'categories',
     'wishlist',
     'reviews',
+    'idempotency',
+    # Project-wide management commands, see commerce.management
+    'commerce',
     'corsheaders',
     'rest_framework',
     'rest_framework.authtoken',
@@ -122,6 +125,83 @@ else:
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Defaults to an in-process cache. Point DJANGO_CACHE_BACKEND at
+# 'django.core.cache.backends.filebased.FileBasedCache' or
+# 'django.core.cache.backends.redis.RedisCache' (with DJANGO_CACHE_LOCATION set
+# to a directory or redis:// URL) to share it between worker processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'smartsouq'),
+    }
+}
+
+# Rendered product/category documents, see commerce.cache.DocumentCache
+DOCUMENT_CACHE_ALIAS = 'default'
+DOCUMENT_CACHE_TIMEOUT = int(os.environ.get('DOCUMENT_CACHE_TIMEOUT', 60 * 60))
+
+# Cart and wishlist badge counts, see commerce.cache.CachedCount
+COUNT_CACHE_TIMEOUT = int(os.environ.get('COUNT_CACHE_TIMEOUT', 15 * 60))
+
+# How long a stored Idempotency-Key response can be replayed, in seconds
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# Token -> user lookups, see accounts.authentication. The per-process copy
+# cannot be invalidated from other workers, so its timeout stays short.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 5 * 60))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024))
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 10))
+
+# Tokens expire this long after their last renewal, and are renewed at most
+# once per interval while in use, in seconds
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 14 * 24 * 60 * 60))
+AUTH_TOKEN_RENEW_INTERVAL = int(os.environ.get('AUTH_TOKEN_RENEW_INTERVAL', 24 * 60 * 60))
+
+# Password hashing process pool, see accounts.hashing. Requests beyond the
+# workers plus the pending limit get a 429; 0 workers hashes inline. Their
+# sum is how many request workers logins can hold at once.
+PASSWORD_HASHER_WORKERS = int(os.environ.get('PASSWORD_HASHER_WORKERS', 2))
+PASSWORD_HASHER_MAX_PENDING = int(os.environ.get('PASSWORD_HASHER_MAX_PENDING', 2))
+PASSWORD_HASHER_TIMEOUT = 10
+PASSWORD_HASHER_RETRY_AFTER = 1
+
+# The default hashers, with PBKDF2 derived in the pool above
+PASSWORD_HASHERS = [
+    'accounts.hashing.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Bulk product import, see products.bulk. Bodies of at least
+# PRODUCT_IMPORT_COPY_MIN_BYTES are loaded with COPY on PostgreSQL.
+PRODUCT_IMPORT_CHUNK_SIZE = 500
+PRODUCT_IMPORT_COPY_CHUNK_SIZE = 5000
+PRODUCT_IMPORT_COPY_MIN_BYTES = int(os.environ.get('PRODUCT_IMPORT_COPY_MIN_BYTES', 5 * 1024 * 1024))
+
+# Rows fetched per round trip by the streaming exports, see commerce.exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Seconds the changes feeds hold back fresh rows, see commerce.changes. A
+# transaction that writes products or categories (or deletes them) must
+# commit within this long of stamping them, or syncing clients miss it.
+CHANGE_FEED_LAG = int(os.environ.get('CHANGE_FEED_LAG', 5))
+
+# Seconds tombstones are kept for the changes feeds before purge_tombstones
+# deletes them; older watermarks are answered with 410 Gone
+CHANGE_FEED_TOMBSTONE_RETENTION = int(os.environ.get('CHANGE_FEED_TOMBSTONE_RETENTION', 30 * 24 * 60 * 60))
+
+# Anonymous carts live in the cache for this long, in seconds, see cart.guest
+GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL', 30 * 24 * 60 * 60))
+GUEST_CART_MAX_ITEMS = 100
+
+# Most units of one product a cart line may hold, guest carts included
+CART_MAX_QUANTITY = 1000
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -158,6 +238,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded images, see commerce.images
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', BASE_DIR / 'media')
+IMAGE_MAX_SIZE = 2 * 1024 * 1024
+IMAGE_THUMBNAIL_SIZES = [(200, 200), (600, 600)]
+IMAGE_THUMBNAIL_WORKERS = int(os.environ.get('IMAGE_THUMBNAIL_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -166,7 +253,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -178,6 +265,15 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # Proxies in front of the app that append to X-Forwarded-For. With 0 the
+    # throttles key on REMOTE_ADDR, so clients cannot pick their own address.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # Sliding-window limits on login and registration, see accounts.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_username': '5/min',
+        'register_ip': '10/hour',
+    },
 }
 
 # CORS Configuration
@@ -190,6 +286,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Renewed guest cart tokens come back in this header
+CORS_EXPOSE_HEADERS = ['x-cart-token']
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -209,6 +308,8 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+    'x-cart-token',
 ]
 
 # Custom User Model
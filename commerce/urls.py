@@ -14,6 +14,8 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -28,3 +30,6 @@ urlpatterns = [
     path('api/v1/Wishlist/', include('wishlist.urls')),
     path('api/v1/Review/', include('reviews.urls')),
 ]
+
+# Serve uploaded images in development; production serves MEDIA_ROOT directly
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
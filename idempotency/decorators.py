@@ -0,0 +1,88 @@
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+
+
+class _KeyTaken(Exception):
+    """The key was stored by a concurrent request while the view ran."""
+
+
+def _request_hash(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(stored):
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """
+    Honour an `Idempotency-Key` header on a write endpoint.
+
+    The first request with a key runs the view and stores its response in
+    the same transaction as the write. A retry with the same key and body
+    gets the stored response back without running the view again. A retry
+    with a different body is rejected with 422. Server errors are not stored,
+    so they can be retried. Apply it below @permission_classes.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'detail': f'{HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        request_hash = _request_hash(request)
+        now = timezone.now()
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if stored is not None and stored.expires_at <= now:
+            stored.delete()
+            stored = None
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                return Response({'detail': f'{HEADER} was already used for a different request.'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            return _replay(stored)
+
+        try:
+            with transaction.atomic():
+                response = view(request, *args, **kwargs)
+                if response.status_code >= 500:
+                    return response
+                try:
+                    IdempotencyKey.objects.create(
+                        user=request.user,
+                        key=key,
+                        request_hash=request_hash,
+                        status_code=response.status_code,
+                        response=response.data,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+                except IntegrityError:
+                    # Roll the view's writes back with the transaction
+                    raise _KeyTaken
+        except _KeyTaken:
+            # A concurrent request with the same key committed first
+            stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if stored is None or stored.request_hash != request_hash:
+                return Response({'detail': f'A request with this {HEADER} is already in progress.'}, status=status.HTTP_409_CONFLICT)
+            return _replay(stored)
+        return response
+
+    return wrapper
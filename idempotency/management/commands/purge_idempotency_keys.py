@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from commerce.purge import purge_in_batches
+from idempotency.models import IdempotencyKey
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of keys deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+        deleted = purge_in_batches(expired, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.'))
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+from accounts.models import User
+from products.models import Product
+from categories.models import Category
+from orders.models import Order
+from cart.models import CartItem
+from .decorators import idempotent
+from .models import IdempotencyKey
+
+# Create your tests here.
+
+class IdempotencyKeyTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass')
+        self.seller = User.objects.create_user(username='seller', email='seller@example.com', password='sellerpass')
+        self.category = Category.objects.create(name='Tech', description='Tech category')
+        self.product = Product.objects.create(
+            name='Phone',
+            description='A smart phone',
+            price=500.00,
+            quantity=5,
+            category=self.category,
+            seller=self.seller
+        )
+        self.client.login(username='buyer', password='buyerpass')
+
+    def order_data(self, quantity=1):
+        return {'products': [{'product_id': self.product.id, 'quantity': quantity}], 'seller': self.seller.id}
+
+    def test_replayed_order_is_created_once(self):
+        """Check if retrying an order with the same key returns the first response"""
+        url = reverse('order-create')
+        first = self.client.post(url, self.order_data(), format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        second = self.client.post(url, self.order_data(), format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+
+    def test_replayed_add_to_cart_does_not_inflate_quantity(self):
+        """Check if retrying an add to cart only adds once"""
+        url = reverse('cart-add', args=[self.product.id])
+        for _ in range(3):
+            response = self.client.post(url, {'quantity': 2}, HTTP_IDEMPOTENCY_KEY='cart-1')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(CartItem.objects.get(user=self.user).quantity, 2)
+
+    def test_view_integrity_error_is_not_in_progress(self):
+        """Check if an IntegrityError raised by the view is not reported as a key conflict"""
+        @api_view(['POST'])
+        @idempotent
+        def failing(request):
+            raise IntegrityError('duplicate row')
+
+        request = APIRequestFactory().post('/', {}, HTTP_IDEMPOTENCY_KEY='failing-1')
+        force_authenticate(request, user=self.user)
+        with self.assertRaises(IntegrityError):
+            failing(request)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_different_request(self):
+        """Check if a key cannot be reused with a different body"""
+        url = reverse('order-create')
+        self.client.post(url, self.order_data(1), format='json', HTTP_IDEMPOTENCY_KEY='order-2')
+        response = self.client.post(url, self.order_data(2), format='json', HTTP_IDEMPOTENCY_KEY='order-2')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        url = reverse('order-create')
+        self.client.post(url, self.order_data(), format='json')
+        self.client.post(url, self.order_data(), format='json')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_expired_key_runs_again(self):
+        """Check if an expired key no longer replays"""
+        url = reverse('order-create')
+        self.client.post(url, self.order_data(), format='json', HTTP_IDEMPOTENCY_KEY='order-3')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.client.post(url, self.order_data(), format='json', HTTP_IDEMPOTENCY_KEY='order-3')
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_purge_idempotency_keys(self):
+        """Check if the purge command deletes only expired keys"""
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(user=self.user, key=f'old-{i}', request_hash='x', status_code=201, expires_at=now - timedelta(hours=1))
+            for i in range(5)
+        ] + [IdempotencyKey(user=self.user, key='fresh', request_hash='x', status_code=201, expires_at=now + timedelta(hours=1))])
+        call_command('purge_idempotency_keys', batch_size=2, stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
@@ -0,0 +1,77 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.utils import timezone
+
+from products.models import Product
+from products.cache import product_documents
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f'Insufficient stock for products {product_ids}')
+        self.product_ids = product_ids
+
+
+def _locked_products(product_ids):
+    # Every writer takes product row locks in ascending id order, so two
+    # checkouts that share products queue behind each other instead of
+    # deadlocking.
+    return Product.objects.select_for_update().filter(pk__in=list(product_ids)).order_by('pk')
+
+
+def _quantity_delta(quantities):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _invalidate_after_commit(product_ids):
+    transaction.on_commit(lambda: product_documents.invalidate(*product_ids))
+
+
+def reserve_stock(quantities):
+    """
+    Take `quantities` ({product_id: quantity}) out of stock and return the
+    locked products that exist, keyed by id. Unknown product ids are
+    ignored. Raises InsufficientStock, reserving nothing, if any product is
+    short. Must be called inside transaction.atomic().
+    """
+    products = {product.pk: product for product in _locked_products(quantities)}
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if product_id in products}
+    if not quantities:
+        return products
+
+    short = sorted(product_id for product_id, quantity in quantities.items() if products[product_id].quantity < quantity)
+    if short:
+        raise InsufficientStock(short)
+
+    # One conditional UPDATE; the WHERE clause re-checks stock in the database
+    # so a reservation can never drive a quantity below zero.
+    condition = reduce(or_, [Q(pk=product_id, quantity__gte=quantity) for product_id, quantity in quantities.items()])
+    updated = Product.objects.filter(condition).update(
+        quantity=F('quantity') - _quantity_delta(quantities),
+        updated_at=timezone.now(),
+    )
+    if updated != len(quantities):
+        raise InsufficientStock(sorted(quantities))
+    _invalidate_after_commit(list(quantities))
+    return products
+
+
+def release_stock(order):
+    """Put the quantities of `order` back in stock. Must be called inside transaction.atomic()."""
+    quantities = {}
+    for product_id, quantity in order.order_products.values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        return
+    list(_locked_products(quantities).values_list('pk', flat=True))
+    Product.objects.filter(pk__in=quantities).update(
+        quantity=F('quantity') + _quantity_delta(quantities),
+        updated_at=timezone.now(),
+    )
+    _invalidate_after_commit(list(quantities))
@@ -1,22 +1,34 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from commerce.serializers import EagerLoadingMixin
 from .models import Order, OrderProduct
 from products.serializers import ProductSerializer
 
 # Create your serializers here.
 
-class OrderProductSerializer(serializers.ModelSerializer):
+class OrderProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=ProductSerializer.Meta.model.objects.all(), source='product', write_only=True)
 
     class Meta:
         model = OrderProduct
         fields = ['id', 'product', 'product_id', 'quantity']
+        select_related = ProductSerializer.nested_select_related('product')
+        only = ['id', 'order', 'product', 'quantity', *ProductSerializer.nested_only('product')]
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     order_products = OrderProductSerializer(many=True, read_only=True)
     user = serializers.StringRelatedField(read_only=True)
     seller = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'seller', 'totalPrice', 'paymentMethod', 'status', 'order_products', 'created_at', 'updated_at'] 
\ No newline at end of file
+        fields = ['id', 'user', 'seller', 'totalPrice', 'paymentMethod', 'status', 'order_products', 'created_at', 'updated_at']
+        select_related = ['user', 'seller']
+        prefetch_related = [
+            Prefetch('order_products', queryset=OrderProductSerializer.setup_eager_loading(OrderProduct.objects.all())),
+        ]
+        only = [
+            'id', 'user', 'seller', 'totalPrice', 'paymentMethod', 'status', 'created_at', 'updated_at',
+            'user__username', 'seller__username',
+        ]
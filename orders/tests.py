@@ -1,4 +1,7 @@
+import json
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -39,6 +42,72 @@ class OrderAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(Order.objects.filter(user=self.user).count() >= 1)
 
+    def test_create_order_total_computed_server_side(self):
+        """Check if the order total comes from product prices, not the client"""
+        self.client.login(username='buyer', password='buyerpass')
+        data = {
+            'products': [{'product_id': self.product.id, 'quantity': 2}, {'product_id': self.product.id, 'quantity': 1}],
+            'seller': self.seller.id,
+            'totalPrice': 1.00,
+        }
+        response = self.client.post(reverse('order-create'), data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['totalPrice'], '1500.00')
+        self.assertEqual(response.data['order_products'][0]['quantity'], 3)
+
+    def test_create_order_query_count_independent_of_lines(self):
+        """Check if bigger baskets do not cost more queries"""
+        products = [
+            Product.objects.create(name=f'Item {i}', description='Item', price=1.00, quantity=10,
+                                   category=self.category, seller=self.seller)
+            for i in range(10)
+        ]
+        self.client.force_authenticate(self.user)
+        counts = []
+        for basket in (products[:1], products):
+            data = {'products': [{'product_id': p.id, 'quantity': 1} for p in basket], 'seller': self.seller.id}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('order-create'), data, format='json')
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_order_reserves_stock(self):
+        """Check if placing an order takes its quantities out of stock"""
+        self.client.login(username='buyer', password='buyerpass')
+        data = {'products': [{'product_id': self.product.id, 'quantity': 2}], 'seller': self.seller.id}
+        response = self.client.post(reverse('order-create'), data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_create_order_insufficient_stock(self):
+        """Check if an order for more than is in stock is rejected without side effects"""
+        other = Product.objects.create(name='Case', description='A case', price=10.00, quantity=10,
+                                       category=self.category, seller=self.seller)
+        self.client.login(username='buyer', password='buyerpass')
+        data = {
+            'products': [{'product_id': other.id, 'quantity': 1}, {'product_id': self.product.id, 'quantity': 6}],
+            'seller': self.seller.id,
+        }
+        response = self.client.post(reverse('order-create'), data, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['products'], [self.product.id])
+        other.refresh_from_db()
+        self.assertEqual(other.quantity, 10)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_cancel_order_releases_stock(self):
+        """Check if cancelling an order puts its stock back exactly once"""
+        self.client.login(username='buyer', password='buyerpass')
+        url = reverse('order-update-status', args=[self.order.id, 'Cancelled'])
+        self.assertEqual(self.client.put(url).status_code, 200)
+        self.assertEqual(self.client.put(url).status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+        response = self.client.put(reverse('order-update-status', args=[self.order.id, 'Paid']))
+        self.assertEqual(response.status_code, 400)
+
     def test_list_orders(self):
         """Check if buyers can list orders"""
         self.client.login(username='buyer', password='buyerpass')
@@ -47,6 +116,19 @@ class OrderAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_list_orders_query_count(self):
+        """Check if listing orders costs the same number of queries for any number of rows"""
+        for i in range(5):
+            order = Order.objects.create(user=self.user, seller=self.seller, totalPrice=500.00)
+            OrderProduct.objects.create(order=order, product=self.product, quantity=i + 1)
+            OrderProduct.objects.create(order=order, product=self.product, quantity=1)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data), 6)
+        self.assertEqual(response.data[0]['order_products'][0]['product']['category']['name'], 'Tech')
+        self.assertEqual(response.data[0]['seller'], 'seller')
+
     def test_retrieve_order(self):
         """Check if buyers can retrieve an order"""
         self.client.login(username='buyer', password='buyerpass')
@@ -55,6 +137,20 @@ class OrderAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['id'], self.order.id)
 
+    def test_retrieve_order_not_modified(self):
+        """Check if an unchanged order is answered with 304 from one probe query"""
+        self.client.force_authenticate(self.user)
+        url = reverse('order-detail', args=[self.order.id])
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # A change to an embedded product changes the order's version
+        self.product.name = 'New Phone'
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
     def test_delete_order(self):
         """Check if buyers can delete an order"""
         self.client.login(username='buyer', password='buyerpass')
@@ -62,6 +158,16 @@ class OrderAPITestCase(APITestCase):
         response = self.client.delete(url)
         self.assertEqual(response.status_code, 204)
         self.assertFalse(Order.objects.filter(id=self.order.id).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
+
+    def test_delete_cancelled_order_keeps_stock(self):
+        """Check if deleting a cancelled order does not release its stock twice"""
+        self.client.login(username='buyer', password='buyerpass')
+        self.client.put(reverse('order-update-status', args=[self.order.id, 'Cancelled']))
+        self.client.delete(reverse('order-delete', args=[self.order.id]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 6)
 
     def test_update_order_status(self):
         """Check if buyers can update an order status"""
@@ -104,6 +210,33 @@ class OrderAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_export_orders(self):
+        """Check if admins can stream orders as NDJSON or CSV"""
+        Order.objects.create(user=self.user, seller=self.seller, totalPrice=20.00, status='Paid')
+        User.objects.create_user(username='admin', email='admin@example.com', password='adminpass', is_staff=True)
+        self.client.login(username='admin', password='adminpass')
+        url = reverse('order-export')
+
+        response = self.client.get(url, {'status': 'Paid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['status'], row['totalPrice'], row['user__username']) for row in rows], [('Paid', '20.00', 'buyer')])
+
+        response = self.client.get(url, {'output': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_id', 'user__username'])
+        self.assertEqual(len(lines), 3)
+
+        self.assertEqual(self.client.get(url, {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'user': 'me'}).status_code, 400)
+
+    def test_export_orders_admin_only(self):
+        """Check if non-admins cannot export orders"""
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.get(reverse('order-export'))
+        self.assertEqual(response.status_code, 403)
+
     def test_list_user_orders_by_status(self):
         """Check if buyers can list user orders by status"""
         self.client.login(username='buyer', password='buyerpass')
@@ -7,6 +7,7 @@ urlpatterns = [
     path('<int:pk>/', views.retrieve_order, name='order-detail'),  # GET /api/v1/Order/:orderId
     path('<int:pk>/delete/', views.delete_order, name='order-delete'),  # DELETE /api/v1/Order/:orderId
     path('<int:pk>/<str:status_str>/', views.update_order_status, name='order-update-status'),  # PUT /api/v1/Order/:orderId/:status
+    path('export/', views.export_orders, name='order-export'),  # GET /api/v1/Order/export/?output=csv&status=Paid
     path('total/', views.get_order_total, name='order-total'),  # GET /api/v1/Order/total
     path('user/<int:user_id>/', views.list_orders_by_user, name='order-list-by-user'),  # GET /api/v1/Order/:userId
     path('Product/<int:product_id>/count/', views.list_orders_by_product, name='order-list-by-product'),  # GET /api/v1/Order/Product/:productId/count
@@ -3,21 +3,26 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
+from idempotency.decorators import idempotent
 from .models import Order, OrderProduct
 from .serializers import OrderSerializer, OrderProductSerializer
+from .inventory import InsufficientStock, reserve_stock, release_stock
 from products.models import Product
 from accounts.models import User
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Max, Sum, prefetch_related_objects
+from commerce.conditional import add_validators, not_modified
+from commerce.exports import export_response
 
 # Create your views here.
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request):
     # Expecting products as a list of {product_id, quantity}
     products_data = request.data.get('products')
     seller_id = request.data.get('seller')
-    total_price = request.data.get('totalPrice')
     payment_method = request.data.get('paymentMethod', 'COD')
 
     # Validate required fields
@@ -25,8 +30,6 @@ def create_order(request):
         return Response({'detail': 'Products list is required and cannot be empty.'}, status=status.HTTP_400_BAD_REQUEST)
     if not seller_id:
         return Response({'detail': 'Seller is required.'}, status=status.HTTP_400_BAD_REQUEST)
-    if not total_price:
-        return Response({'detail': 'Total price is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Validate seller
     try:
@@ -34,25 +37,37 @@ def create_order(request):
     except User.DoesNotExist:
         return Response({'detail': 'Seller not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Validate each product
-    valid_products = []
+    # Validate each line, merging repeated products
+    quantities = {}
     for item in products_data:
-        product_id = item.get('product_id')
-        quantity = item.get('quantity')
-        if not product_id or not quantity or int(quantity) <= 0:
-            continue
         try:
-            product = Product.objects.get(pk=product_id)
-        except Product.DoesNotExist:
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity'))
+        except (AttributeError, TypeError, ValueError):
             continue
-        valid_products.append((product, int(quantity)))
-
-    if not valid_products:
-        return Response({'detail': 'No valid products to order.'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity <= 0:
+            continue
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
 
-    order = Order.objects.create(user=request.user, seller=seller, totalPrice=total_price, paymentMethod=payment_method)
-    for product, quantity in valid_products:
-        OrderProduct.objects.create(order=order, product=product, quantity=quantity)
+    try:
+        with transaction.atomic():
+            # Resolve and lock every product in one query, then reserve stock
+            products = reserve_stock(quantities)
+            valid_products = [(products[product_id], quantity) for product_id, quantity in quantities.items() if product_id in products]
+            if not valid_products:
+                return Response({'detail': 'No valid products to order.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # The total is always computed from current prices, never taken from the client
+            total_price = sum(product.price * quantity for product, quantity in valid_products)
+
+            order = Order.objects.create(user=request.user, seller=seller, totalPrice=total_price, paymentMethod=payment_method)
+            OrderProduct.objects.bulk_create([
+                OrderProduct(order=order, product=product, quantity=quantity)
+                for product, quantity in valid_products
+            ])
+    except InsufficientStock as e:
+        return Response({'detail': 'Insufficient stock.', 'products': e.product_ids}, status=status.HTTP_409_CONFLICT)
+    prefetch_related_objects([order], *OrderSerializer.Meta.prefetch_related)
     serializer = OrderSerializer(order)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -66,34 +81,61 @@ def list_orders(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def retrieve_order(request, pk):
+    # The order embeds its users, products and their categories, so its
+    # version is the newest updated_at among all of them, read in one probe
+    stamps = (
+        Order.objects.filter(pk=pk, user=request.user)
+        .annotate(
+            products_updated=Max('order_products__product__updated_at'),
+            categories_updated=Max('order_products__product__category__updated_at'),
+        )
+        .values_list('updated_at', 'user__updated_at', 'seller__updated_at', 'products_updated', 'categories_updated')
+        .first()
+    )
+    if stamps is None:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    updated_at = max(stamp for stamp in stamps if stamp is not None)
+    response = not_modified(request, pk, updated_at)
+    if response is not None:
+        return response
     try:
-        order = Order.objects.get(pk=pk, user=request.user)
+        order = OrderSerializer.setup_eager_loading(Order.objects.all()).get(pk=pk, user=request.user)
     except Order.DoesNotExist:
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
     serializer = OrderSerializer(order)
-    return Response(serializer.data)
+    return add_validators(Response(serializer.data), pk, updated_at)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_order(request, pk):
-    try:
-        order = Order.objects.get(pk=pk, user=request.user)
-    except Order.DoesNotExist:
-        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    order.delete()
+    with transaction.atomic():
+        try:
+            order = Order.objects.select_for_update().get(pk=pk, user=request.user)
+        except Order.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        # Its reservation would otherwise stay off the shelf for good
+        if order.status != 'Cancelled':
+            release_stock(order)
+        order.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, pk, status_str):
-    try:
-        order = Order.objects.get(pk=pk, user=request.user)
-    except Order.DoesNotExist:
-        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
     if status_str not in dict(Order.STATUS_CHOICES):
         return Response({'detail': 'Invalid status.'}, status=status.HTTP_400_BAD_REQUEST)
-    order.status = status_str
-    order.save()
+    with transaction.atomic():
+        try:
+            order = Order.objects.select_for_update().get(pk=pk, user=request.user)
+        except Order.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if order.status == 'Cancelled' and status_str != 'Cancelled':
+            # Its stock has already been released
+            return Response({'detail': 'Cancelled orders cannot be reopened.'}, status=status.HTTP_400_BAD_REQUEST)
+        if status_str == 'Cancelled' and order.status != 'Cancelled':
+            release_stock(order)
+        order.status = status_str
+        order.save()
     serializer = OrderSerializer(order)
     return Response(serializer.data)
 
@@ -129,3 +171,8 @@ def list_user_orders_by_status(request, user_id, status_str):
     orders = Order.objects.filter(user_id=user_id, status=status_str)
     serializer = OrderSerializer(orders, many=True)
     return Response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def export_orders(request):
+    return export_response(request, 'orders')
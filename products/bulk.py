@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+from itertools import islice
+from uuid import uuid4
+
+from django.db import connection, transaction
+from rest_framework import serializers
+
+from categories.models import Category
+from .cache import product_documents
+from .models import Product
+from . import search
+
+# Bulk product import from a streamed CSV or NDJSON body.
+#
+# Rows are read off the request a line at a time and handled in chunks:
+# every row in a chunk is validated without touching the database, then the
+# chunk's category ids and product ids are looked up with one query each,
+# and the rows are written with one bulk_create and one bulk_update. Rows
+# with an `id` update that product, the others create one. Each chunk
+# commits on its own, so a bad row never holds back the rest of the file.
+
+CSV_TYPES = {'text/csv'}
+NDJSON_TYPES = {'application/x-ndjson', 'application/ndjson', 'application/jsonl'}
+STAGING_TABLE = 'products_product_import'
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+class ProductRowSerializer(serializers.ModelSerializer):
+    # Plain ids, checked against the chunk's lookups instead of one query per row
+    id = serializers.IntegerField(required=False, min_value=1)
+    category_id = serializers.IntegerField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'quantity', 'category_id', 'imageProduct']
+
+
+def _decode(stream):
+    for line in stream:
+        try:
+            yield line.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BulkImportError('Body must be UTF-8.')
+
+
+def read_csv(stream):
+    """Yield `(data, error)` for each record of a CSV body with a header row."""
+    records = csv.DictReader(_decode(stream))
+    while True:
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            raise BulkImportError(f'Invalid CSV: {e}.')
+        # Empty cells are left out, so an update row only changes what it fills in
+        yield {key: value for key, value in record.items() if key and value not in (None, '')}, None
+
+
+def read_ndjson(stream):
+    """Yield `(data, error)` for each non-blank line of an NDJSON body."""
+    for line in _decode(stream):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield None, 'Invalid JSON.'
+            continue
+        if not isinstance(data, dict):
+            yield None, 'Expected a JSON object.'
+            continue
+        yield data, None
+
+
+class ProductImport:
+    """
+    Import rows for `seller`, `chunk_size` at a time. `report` holds the
+    counts so far and an error entry per rejected row, numbered from 1.
+    With `copy`, new rows go through a COPY into a staging table on
+    PostgreSQL.
+    """
+
+    def __init__(self, seller, chunk_size, copy=False):
+        self.seller = seller
+        self.chunk_size = chunk_size
+        self.copy = copy and connection.vendor == 'postgresql'
+        self.report = {'created': 0, 'updated': 0, 'errors': []}
+
+    def run(self, rows):
+        rows = enumerate(rows, 1)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+        return self.report
+
+    def reject(self, number, errors):
+        self.report['errors'].append({'row': number, 'errors': errors})
+
+    def import_chunk(self, chunk):
+        errors = self.report['errors']
+        first_error = len(errors)
+        valid = []
+        for number, (data, error) in chunk:
+            if error:
+                self.reject(number, {'non_field_errors': [error]})
+                continue
+            serializer = ProductRowSerializer(data=data, partial='id' in data)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.reject(number, serializer.errors)
+
+        category_ids = {data['category_id'] for _, data in valid if 'category_id' in data}
+        categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+        products = Product.objects.filter(pk__in=[data['id'] for _, data in valid if 'id' in data])
+        if not self.seller.is_superuser:
+            products = products.filter(seller=self.seller)
+        products = products.in_bulk()
+
+        created, updated, fields = [], {}, set()
+        for number, data in valid:
+            data = dict(data)
+            if 'category_id' in data and data['category_id'] not in categories:
+                self.reject(number, {'category_id': [f'Invalid pk "{data["category_id"]}" - object does not exist.']})
+                continue
+            pk = data.pop('id', None)
+            if pk is None:
+                created.append(Product(seller=self.seller, **data))
+                continue
+            product = products.get(pk)
+            if product is None:
+                self.reject(number, {'id': ['Not found.']})
+                continue
+            for field, value in data.items():
+                setattr(product, field, value)
+            fields.update(data)
+            # A later row for the same product wins
+            updated[pk] = product
+        self.write(created, list(updated.values()), fields)
+        errors[first_error:] = sorted(errors[first_error:], key=lambda error: error['row'])
+
+    def write(self, created, updated, fields):
+        with transaction.atomic():
+            if created and self.copy:
+                self.copy_create(created)
+            elif created:
+                created = Product.objects.bulk_create(created)
+                search.index_products(created)
+            if updated:
+                for product in updated:
+                    # bulk_update skips auto_now, and the changes feed reads updated_at
+                    Product._meta.get_field('updated_at').pre_save(product, add=False)
+                Product.objects.bulk_update(updated, sorted(fields | {'updated_at'}))
+                search.index_products(updated)
+        pks = [product.pk for product in updated]
+        transaction.on_commit(lambda: product_documents.invalidate(*pks))
+        self.report['created'] += len(created)
+        self.report['updated'] += len(updated)
+
+    def copy_create(self, products):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        # New rows have nothing cached or indexed yet: the tsvector column is
+        # generated by the database, so their ids are never read back.
+        fields = [field for field in Product._meta.concrete_fields if not field.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        table = connection.ops.quote_name(Product._meta.db_table)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for product in products:
+            writer.writerow([field.get_db_prep_save(field.pre_save(product, add=True), connection) for field in fields])
+        buffer.seek(0)
+        # Named per chunk, so an outer transaction or a table left behind by a
+        # failed chunk on this connection never collides with the next one
+        staging = connection.ops.quote_name(f'{STAGING_TABLE}_{uuid4().hex}')
+        sql = f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            if is_psycopg3:
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+            else:
+                cursor.copy_expert(sql, buffer)
+            cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}')
+            # Dropped now as well, ON COMMIT only fires when an outer transaction ends
+            cursor.execute(f'DROP TABLE {staging}')
@@ -0,0 +1,17 @@
+from commerce.cache import DocumentCache
+
+from .models import Product
+from .serializers import ProductSerializer
+
+
+def _build_product_document(pk):
+    try:
+        product = ProductSerializer.setup_eager_loading(Product.objects.all()).get(pk=pk)
+    except Product.DoesNotExist:
+        return None
+    # The document embeds the category and seller, so it changes with any of the rows
+    updated_at = max(product.updated_at, product.category.updated_at, product.seller.updated_at)
+    return updated_at, ProductSerializer(product).data, [f'category:{product.category_id}', f'seller:{product.seller_id}']
+
+
+product_documents = DocumentCache('product', _build_product_document)
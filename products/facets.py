@@ -0,0 +1,86 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import BigIntegerField, Case, CharField, Count, F, Value, When
+
+# Lower bounds of the price facet buckets, the last bucket is open ended
+PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _parse_ids(value, name):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise FilterError(f'Invalid {name}.')
+
+
+def _parse_price(value, name):
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise FilterError(f'Invalid {name}.')
+    # NaN and Infinity parse, but no DecimalField lookup accepts them
+    if not price.is_finite():
+        raise FilterError(f'Invalid {name}.')
+    return price
+
+
+def filter_products(queryset, params):
+    """
+    Apply the catalog filters from the query string:
+    ?category=1,2&seller=3&min_price=10&max_price=99.99&in_stock=true
+    """
+    if params.get('category'):
+        queryset = queryset.filter(category_id__in=_parse_ids(params['category'], 'category'))
+    if params.get('seller'):
+        queryset = queryset.filter(seller_id__in=_parse_ids(params['seller'], 'seller'))
+    if params.get('min_price'):
+        queryset = queryset.filter(price__gte=_parse_price(params['min_price'], 'min_price'))
+    if params.get('max_price'):
+        queryset = queryset.filter(price__lte=_parse_price(params['max_price'], 'max_price'))
+    if params.get('in_stock', '').lower() in ('1', 'true', 'yes'):
+        queryset = queryset.filter(quantity__gt=0)
+    return queryset
+
+
+def _facet(queryset, name, key, label):
+    return (
+        queryset.order_by()
+        .annotate(key=key, label=label)
+        .values('key', 'label')
+        .annotate(count=Count('id'), facet=Value(name))
+        .values_list('facet', 'key', 'label', 'count')
+    )
+
+
+def facet_counts(queryset):
+    """
+    Count the products of `queryset` per category, seller and price bucket.
+
+    The three GROUP BYs are sent as one UNION ALL query, served by the
+    (category, price) and (seller, created_at) indexes.
+    """
+    bucket = Case(
+        *[When(price__gte=bound, then=Value(bound)) for bound in reversed(PRICE_BUCKETS)],
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+    no_label = Value('', output_field=CharField())
+    rows = _facet(queryset, 'category', F('category_id'), F('category__name')).union(
+        _facet(queryset, 'seller', F('seller_id'), F('seller__username')),
+        _facet(queryset, 'price', bucket, no_label),
+        all=True,
+    )
+
+    facets = {'category': [], 'seller': [], 'price': []}
+    for facet, key, label, count in rows:
+        if facet == 'price':
+            upper = next((bound for bound in PRICE_BUCKETS if bound > key), None)
+            facets['price'].append({'min': key, 'max': upper, 'count': count})
+        else:
+            facets[facet].append({'id': key, 'name': label, 'count': count})
+    facets['price'].sort(key=lambda bucket: bucket['min'])
+    return facets
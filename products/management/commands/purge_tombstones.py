@@ -0,0 +1,26 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from categories.models import CategoryTombstone
+from commerce.purge import purge_in_batches
+from products.models import ProductTombstone
+
+class Command(BaseCommand):
+    help = 'Delete changes feed tombstones older than CHANGE_FEED_TOMBSTONE_RETENTION in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        # Watermarks older than this are refused by the feeds, see commerce.changes
+        cutoff = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_TOMBSTONE_RETENTION)
+        batch_size = options['batch_size']
+        products = purge_in_batches(ProductTombstone.objects.filter(deleted_at__lt=cutoff), batch_size)
+        categories = purge_in_batches(CategoryTombstone.objects.filter(deleted_at__lt=cutoff), batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {products} product and {categories} category tombstones.'))
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            "name, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO products_product_fts (rowid, name, description) '
+            'SELECT id, name, description FROM products_product'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE products_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ('
+            "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+            ') STORED'
+        )
+        schema_editor.execute(
+            'CREATE INDEX product_search_vector_idx ON products_product USING gin (search_vector)'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_search_vector_idx')
+        schema_editor.execute('ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -11,8 +11,41 @@ class Product(models.Model):
     category = models.ForeignKey('categories.Category', on_delete=models.CASCADE, related_name='products')
     imageProduct = models.CharField(max_length=255, default='default.jpg')
     seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products')
+    # Review aggregates, kept current by reviews.ratings
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination sort keys, see products.pagination
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            # Catalog filters and facet counts, see products.facets
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['seller', 'created_at'], name='product_seller_created_idx'),
+            # A category's products newest first, see categories.views.list_category_products
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+            # Delta sync, see commerce.changes
+            models.Index(fields=['updated_at', 'id'], name='product_updated_id_idx'),
+        ]
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class ProductTombstone(models.Model):
+    """Records a deleted product's id for the changes feed, see commerce.changes."""
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='product_tombstone_deleted_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,11 @@
+from commerce.pagination import KeysetPagination
+
+
+class ProductPagination(KeysetPagination):
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+    default_ordering = 'newest'
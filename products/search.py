@@ -0,0 +1,111 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+# SQLite keeps an FTS5 table next to products_product, keyed by product id.
+# PostgreSQL keeps a generated tsvector column with a GIN index on the
+# product table itself. Both are created in migration 0004.
+FTS_TABLE = 'products_product_fts'
+TSVECTOR_COLUMN = 'search_vector'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall(query or '')[:16]
+
+
+def index_products(products):
+    """Write the current name/description of `products` into the FTS index."""
+    if connection.vendor != 'sqlite':
+        # The PostgreSQL tsvector column is generated by the database.
+        return
+    rows = [(product.pk, product.name, product.description) for product in products]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(rows))})',
+            [row[0] for row in rows],
+        )
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)', rows)
+
+
+def remove_products(product_ids):
+    if connection.vendor != 'sqlite':
+        return
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(product_ids))})',
+            product_ids,
+        )
+
+
+def encode_cursor(score, pk):
+    payload = json.dumps([score, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """Return the `(score, id)` in a search cursor, or raise ValueError."""
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        score, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as e:
+        raise ValueError('Invalid cursor.') from e
+
+
+def search_product_ids(query, limit, after=None):
+    """
+    Return up to `limit` `(id, score)` pairs for the products matching every
+    term of `query` (as a prefix), best match (lowest score) first. `after`
+    is the `(score, id)` of the last result already returned; the next ones
+    are picked with a keyset filter on it rather than an OFFSET, so a deep
+    page costs what the first one does and a write never shifts it.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    if connection.vendor == 'sqlite':
+        matches = (
+            f'SELECT rowid AS id, bm25({FTS_TABLE}, 10.0, 1.0) AS score FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s'
+        )
+        params = [' '.join(f'"{token}"*' for token in tokens)]
+    elif connection.vendor == 'postgresql':
+        # Negated so both backends sort ascending; double precision so the
+        # score survives the round trip through the cursor exactly
+        matches = (
+            f'SELECT id, (-ts_rank({TSVECTOR_COLUMN}, query))::double precision AS score '
+            f'FROM {Product._meta.db_table}, to_tsquery(\'simple\', %s) query WHERE {TSVECTOR_COLUMN} @@ query'
+        )
+        params = [' & '.join(f'{token}:*' for token in tokens)]
+    else:
+        condition = Q()
+        for token in tokens:
+            condition &= Q(name__icontains=token) | Q(description__icontains=token)
+        products = Product.objects.filter(condition).order_by('id')
+        if after is not None:
+            products = products.filter(id__gt=after[1])
+        return [(pk, 0.0) for pk in products.values_list('id', flat=True)[:limit]]
+
+    sql = f'SELECT id, score FROM ({matches}) matches'
+    if after is not None:
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(row[0], row[1]) for row in cursor.fetchall()]
@@ -1,15 +1,52 @@
 from rest_framework import serializers
+from commerce.serializers import EagerLoadingMixin
 from .models import Product
 from categories.models import Category
 from categories.serializers import CategorySerializer
 
 # Create your serializers here.
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), source='category', write_only=True)
     seller = serializers.StringRelatedField(read_only=True)
+    rating_histogram = serializers.SerializerMethodField()
+
+    def get_rating_histogram(self, obj):
+        return {str(star): getattr(obj, f'rating_{star}') for star in range(1, 6)}
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'description', 'price', 'quantity', 'category', 'category_id', 'imageProduct', 'seller',
+                  'rating_avg', 'rating_count', 'rating_histogram', 'created_at', 'updated_at']
+        read_only_fields = ['rating_avg', 'rating_count']
+        select_related = ['category', 'seller']
+        only = [
+            'id', 'name', 'description', 'price', 'quantity', 'category', 'imageProduct', 'seller', 'created_at', 'updated_at',
+            'rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+            *CategorySerializer.nested_only('category'),
+            'seller__username', 'seller__updated_at',
+        ]
+
+
+class ProductChangeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    A product as the changes feed sends it: the category and seller are
+    plain ids. Editing a category or seller does not touch the product's
+    updated_at, so embedded copies would never be sent again; sync clients
+    take categories from the category feed instead.
+    """
+    rating_histogram = serializers.SerializerMethodField()
+
+    def get_rating_histogram(self, obj):
+        return {str(star): getattr(obj, f'rating_{star}') for star in range(1, 6)}
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'quantity', 'category', 'category_id', 'imageProduct', 'seller', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'description', 'price', 'quantity', 'category', 'imageProduct', 'seller', 'rating_avg',
+                  'rating_count', 'rating_histogram', 'created_at', 'updated_at']
+        read_only_fields = fields
+        only = [
+            'id', 'name', 'description', 'price', 'quantity', 'category', 'imageProduct', 'seller', 'created_at', 'updated_at',
+            'rating_avg', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        ]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from categories.models import Category
+from .models import Product, ProductTombstone
+from .cache import product_documents
+from . import search
+
+
+# Cached documents are retired once the write commits. Retired earlier, a
+# concurrent reader could rebuild from the old rows under the new version.
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    search.index_products([instance])
+    pk = instance.pk
+    transaction.on_commit(lambda: product_documents.invalidate(pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+    pk = instance.pk
+    transaction.on_commit(lambda: product_documents.invalidate(pk))
+    ProductTombstone.objects.create(object_id=instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_products(sender, instance, created, **kwargs):
+    # Product documents embed their category
+    if not created:
+        scope = f'category:{instance.pk}'
+        transaction.on_commit(lambda: product_documents.invalidate_scope(scope))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_seller_products(sender, instance, created, update_fields=None, **kwargs):
+    # Product documents only show the seller's username; skip saves such as
+    # the last_login update on every login that cannot change it.
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    scope = f'seller:{instance.pk}'
+    transaction.on_commit(lambda: product_documents.invalidate_scope(scope))
@@ -1,15 +1,27 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from accounts.models import User
 from categories.models import Category
-from .models import Product
+from commerce.changes import encode_watermark
+from .models import Product, ProductTombstone
 
 # Create your tests here.
 
 class ProductAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='seller', email='seller@example.com', password='sellerpass')
         self.category = Category.objects.create(name='Electronics', description='Electronics category')
         self.product = Product.objects.create(
@@ -41,7 +53,108 @@ class ProductAPITestCase(APITestCase):
         url = reverse('product-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
+
+    def test_list_products_keyset_pagination(self):
+        """Check if following next cursors walks every product exactly once"""
+        for i in range(4):
+            Product.objects.create(name=f'Item {i}', description='Item', price=10 * (i % 2),
+                                   quantity=1, category=self.category, seller=self.user)
+        for ordering in ['newest', 'price', '-price']:
+            seen = []
+            url = reverse('product-list') + f'?page_size=2&ordering={ordering}'
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(len(response.data['results']), 2)
+                seen.extend(product['id'] for product in response.data['results'])
+                url = response.data['next']
+            self.assertEqual(sorted(seen), sorted(Product.objects.values_list('id', flat=True)))
+
+    def test_list_products_price_ordering(self):
+        """Check if products can be listed cheapest first"""
+        cheap = Product.objects.create(name='Cable', description='A cable', price=5.00,
+                                       quantity=1, category=self.category, seller=self.user)
+        response = self.client.get(reverse('product-list'), {'ordering': 'price'})
+        self.assertEqual(response.data['results'][0]['id'], cheap.id)
+
+    def test_list_products_invalid_cursor(self):
+        """Check if a malformed cursor is rejected"""
+        response = self.client.get(reverse('product-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_products_filters(self):
+        """Check if products can be filtered by category, seller, price and stock"""
+        other_category = Category.objects.create(name='Books', description='Books category')
+        other_seller = User.objects.create_user(username='seller2', password='sellerpass')
+        book = Product.objects.create(name='Novel', description='A novel', price=20.00, quantity=0,
+                                      category=other_category, seller=other_seller)
+        url = reverse('product-list')
+        ids = lambda response: [p['id'] for p in response.data['results']]
+        self.assertEqual(ids(self.client.get(url, {'category': other_category.id})), [book.id])
+        self.assertEqual(ids(self.client.get(url, {'seller': self.user.id})), [self.product.id])
+        self.assertEqual(ids(self.client.get(url, {'min_price': 100})), [self.product.id])
+        self.assertEqual(ids(self.client.get(url, {'max_price': 50})), [book.id])
+        self.assertEqual(ids(self.client.get(url, {'in_stock': 'true'})), [self.product.id])
+        self.assertEqual(self.client.get(url, {'min_price': 'cheap'}).status_code, 400)
+        for value in ['NaN', 'Infinity', '-inf', 'sNaN']:
+            self.assertEqual(self.client.get(url, {'max_price': value}).status_code, 400)
+
+    def test_list_products_facets(self):
+        """Check if the first page carries facet counts for the current filter"""
+        Product.objects.create(name='Mouse', description='A mouse', price=20.00, quantity=4,
+                               category=self.category, seller=self.user)
+        response = self.client.get(reverse('product-list'))
+        facets = response.data['facets']
+        self.assertEqual(facets['category'], [{'id': self.category.id, 'name': 'Electronics', 'count': 2}])
+        self.assertEqual(facets['seller'], [{'id': self.user.id, 'name': 'seller', 'count': 2}])
+        self.assertEqual(facets['price'], [{'min': 0, 'max': 25, 'count': 1}, {'min': 1000, 'max': None, 'count': 1}])
+        response = self.client.get(reverse('product-list'), {'max_price': 50})
+        self.assertEqual(response.data['facets']['category'][0]['count'], 1)
+
+    def test_search_products(self):
+        """Check if products can be found by name and description prefixes"""
+        Product.objects.create(name='Headphones', description='Wireless noise cancelling',
+                               price=150.00, quantity=3, category=self.category, seller=self.user)
+        url = reverse('product-search')
+        response = self.client.get(url, {'q': 'wirel'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['name'] for p in response.data['results']], ['Headphones'])
+        response = self.client.get(url, {'q': 'laptop powerful'})
+        self.assertEqual([p['name'] for p in response.data['results']], ['Laptop'])
+
+    def test_search_index_follows_updates_and_deletes(self):
+        """Check if the search index is kept in sync with product writes"""
+        url = reverse('product-search')
+        self.product.name = 'Notebook'
+        self.product.description = 'A thin notebook'
+        self.product.save()
+        self.assertEqual(len(self.client.get(url, {'q': 'laptop'}).data['results']), 0)
+        self.assertEqual(len(self.client.get(url, {'q': 'notebook'}).data['results']), 1)
+        self.product.delete()
+        self.assertEqual(len(self.client.get(url, {'q': 'notebook'}).data['results']), 0)
+
+    def test_search_pages_with_cursor(self):
+        """Check if search results page by cursor without repeats or gaps"""
+        for i in range(25):
+            Product.objects.create(name=f'Widget {i}', description='widget ' * (i % 3 + 1), price=5, quantity=1,
+                                   category=self.category, seller=self.user)
+        url = reverse('product-search')
+        seen, params = [], {'q': 'widget'}
+        while True:
+            response = self.client.get(url, params)
+            seen.extend(p['id'] for p in response.data['results'])
+            if not response.data['next']:
+                break
+            params['cursor'] = response.data['next'].split('cursor=')[1]
+        self.assertEqual(sorted(seen), sorted(Product.objects.filter(name__startswith='Widget').values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+        response = self.client.get(url, {'q': 'widget', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_search_requires_query(self):
+        response = self.client.get(reverse('product-search'))
+        self.assertEqual(response.status_code, 400)
 
     def test_retrieve_product(self):
         """Check if users can retrieve a product"""
@@ -50,6 +163,162 @@ class ProductAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['name'], 'Laptop')
 
+    def test_retrieve_product_is_cached(self):
+        """Check if a repeated retrieve is served without touching the database"""
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['name'], 'Laptop')
+        self.assertEqual(response.data['category']['name'], 'Electronics')
+
+    def test_retrieve_product_not_modified(self):
+        """Check if a matching If-None-Match is answered with 304 until the product changes"""
+        url = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.product.price = 900
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_product_invalidated_on_write(self):
+        """Check if product, category and seller changes show up in cached documents"""
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        self.product.name = 'Gaming Laptop'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.client.get(url).data['name'], 'Gaming Laptop')
+        self.category.name = 'Computers'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(self.client.get(url).data['category']['name'], 'Computers')
+        self.user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(url).data['seller'], 'renamed')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_product_kept_until_commit(self):
+        """Check if a product document is only retired once the write commits"""
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        self.product.name = 'Gaming Laptop'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+            self.assertEqual(self.client.get(url).data['name'], 'Laptop')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url).data['name'], 'Gaming Laptop')
+
+    def test_category_save_does_not_scan_products(self):
+        """Check if saving a category or seller retires product documents without querying products"""
+        self.client.get(reverse('product-detail', args=[self.product.id]))
+        with self.assertNumQueries(1):
+            self.category.save()
+        with self.assertNumQueries(1):
+            self.user.save()
+
+    def test_document_cache_stats(self):
+        """Check if admins can read the document cache hit and miss counters"""
+        User.objects.create_user(username='staff', password='staffpass', is_staff=True)
+        self.client.login(username='staff', password='staffpass')
+        url = reverse('product-cache-stats')
+        before = self.client.get(url).data['product']
+        self.client.get(reverse('product-detail', args=[self.product.id]))
+        self.client.get(reverse('product-detail', args=[self.product.id]))
+        after = self.client.get(url).data['product']
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_product_changes(self):
+        """Check if the changes feed returns updates and deletions after the watermark"""
+        other = Product.objects.create(name='Mouse', description='A mouse', price=20.00, quantity=5,
+                                       category=self.category, seller=self.user)
+        url = reverse('product-changes')
+        with self.settings(CHANGE_FEED_LAG=0):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([p['id'] for p in response.data['changed']], [self.product.id, other.id])
+            # Ids only: editing the category or seller does not bring the product back into the feed
+            self.assertEqual((response.data['changed'][0]['category'], response.data['changed'][0]['seller']),
+                             (self.category.id, self.user.id))
+            self.assertEqual(response.data['deleted'], [])
+            self.assertFalse(response.data['more'])
+
+            watermark = response.data['watermark']
+            response = self.client.get(url, {'since': watermark})
+            self.assertEqual(response.data['changed'], [])
+
+            self.product.price = 900.00
+            self.product.save()
+            other_id = other.id
+            other.delete()
+            response = self.client.get(url, {'since': watermark})
+            self.assertEqual([p['id'] for p in response.data['changed']], [self.product.id])
+            self.assertEqual(response.data['deleted'], [other_id])
+
+    def test_product_changes_paging(self):
+        """Check if the changes feed pages with limit and more"""
+        for i in range(2):
+            Product.objects.create(name=f'Item {i}', description='Item', price=10, quantity=1,
+                                   category=self.category, seller=self.user)
+        url = reverse('product-changes')
+        seen, params = [], {'limit': 2}
+        with self.settings(CHANGE_FEED_LAG=0):
+            while True:
+                response = self.client.get(url, params)
+                seen.extend(p['id'] for p in response.data['changed'])
+                params['since'] = response.data['watermark']
+                if not response.data['more']:
+                    break
+        self.assertEqual(sorted(seen), sorted(Product.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_product_changes_lag(self):
+        """Check if the changes feed holds back rows younger than the lag"""
+        with self.settings(CHANGE_FEED_LAG=60):
+            response = self.client.get(reverse('product-changes'))
+        self.assertEqual(response.data['changed'], [])
+
+    def test_product_changes_invalid_watermark(self):
+        """Check if a malformed watermark is rejected"""
+        response = self.client.get(reverse('product-changes'), {'since': 'not-a-watermark'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_changes_expired_watermark(self):
+        """Check if a watermark older than the tombstone retention is answered with 410"""
+        url = reverse('product-changes')
+        old = (timezone.now() - timedelta(days=2)).isoformat()
+        with self.settings(CHANGE_FEED_LAG=0, CHANGE_FEED_TOMBSTONE_RETENTION=24 * 60 * 60):
+            response = self.client.get(url, {'since': encode_watermark([old, 0], [old, 0])})
+            self.assertEqual(response.status_code, 410)
+
+            # Syncing keeps the deleted position current even when nothing is deleted
+            watermark = self.client.get(url).data['watermark']
+            with self.settings(CHANGE_FEED_TOMBSTONE_RETENTION=0):
+                response = self.client.get(url, {'since': watermark})
+            self.assertEqual(response.status_code, 410)
+            response = self.client.get(url, {'since': watermark})
+            self.assertEqual(response.status_code, 200)
+
+    def test_purge_tombstones(self):
+        """Check if purge_tombstones deletes only tombstones past the retention"""
+        ProductTombstone.objects.create(object_id=1)
+        ProductTombstone.objects.create(object_id=2)
+        ProductTombstone.objects.filter(object_id=1).update(deleted_at=timezone.now() - timedelta(days=2))
+        with self.settings(CHANGE_FEED_TOMBSTONE_RETENTION=24 * 60 * 60):
+            call_command('purge_tombstones', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(ProductTombstone.objects.values_list('object_id', flat=True)), [2])
+
     def test_update_product(self):
         """Check if sellers can update their products"""
         self.client.login(username='seller', password='sellerpass')
@@ -81,6 +350,19 @@ class ProductAPITestCase(APITestCase):
         self.product.refresh_from_db()
         self.assertEqual(self.product.imageProduct, 'newimage.jpg')
 
+    def test_update_product_image_multipart(self):
+        """Check if an uploaded file is validated from its bytes and stored by hash"""
+        self.client.login(username='seller', password='sellerpass')
+        url = reverse('product-update-image', args=[self.product.id])
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media, IMAGE_THUMBNAIL_SIZES=[]):
+            upload = SimpleUploadedFile('photo.png', b'\x89PNG\r\n\x1a\n' + b'0' * 64)
+            response = self.client.put(url, {'imageProduct': upload}, format='multipart')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['imageProduct'].endswith('.png'))
+            upload = SimpleUploadedFile('photo.png', b'GIF89a' + b'0' * 64)
+            response = self.client.put(url, {'imageProduct': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+
     def test_permission_required_for_create(self):
         """Check if users can create products"""
         url = reverse('product-create')
@@ -111,3 +393,76 @@ class ProductAPITestCase(APITestCase):
         url = reverse('product-delete', args=[self.product.id])
         response = self.client.delete(url)
         self.assertEqual(response.status_code, 401)
+
+
+class ProductBulkImportTest(APITestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='bulkseller', email='bulk@example.com', password='sellerpass', role='seller')
+        self.other = User.objects.create_user(username='otherseller', email='other@example.com', password='sellerpass', role='seller')
+        self.category = Category.objects.create(name='Garden', description='Garden category')
+        self.product = Product.objects.create(name='Rake', description='A rake', price=15, quantity=3,
+                                              category=self.category, seller=self.seller)
+        self.client.force_authenticate(self.seller)
+        self.url = reverse('product-bulk')
+
+    def test_import_csv(self):
+        """Check if a CSV body creates products in chunks and reports bad rows"""
+        body = 'name,description,price,quantity,category_id\n'
+        body += ''.join(f'Seed {i},Seeds,{i}.50,10,{self.category.id}\n' for i in range(5))
+        body += 'Hose,A hose,cheap,1,%d\n' % self.category.id
+        body += 'Spade,A spade,20,1,999999\n'
+        with self.settings(PRODUCT_IMPORT_CHUNK_SIZE=2):
+            response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual([error['row'] for error in response.data['errors']], [6, 7])
+        self.assertIn('price', response.data['errors'][0]['errors'])
+        self.assertIn('category_id', response.data['errors'][1]['errors'])
+        self.assertEqual(Product.objects.filter(seller=self.seller, name__startswith='Seed').count(), 5)
+
+        response = self.client.get(reverse('product-search'), {'q': 'seed'})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_import_ndjson_updates(self):
+        """Check if NDJSON rows with an id update the seller's own products only"""
+        foreign = Product.objects.create(name='Shears', description='Shears', price=9, quantity=1,
+                                         category=self.category, seller=self.other)
+        stamp = self.product.updated_at
+        lines = [
+            {'id': self.product.id, 'price': '12.00'},
+            {'id': foreign.id, 'price': '1.00'},
+            'not json',
+            {'name': 'Pot', 'description': 'A pot', 'price': '3.00', 'quantity': 7, 'category_id': self.category.id},
+        ]
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+
+        self.product.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual(self.product.price, 12)
+        self.assertEqual(self.product.name, 'Rake')
+        self.assertGreater(self.product.updated_at, stamp)
+        self.assertEqual(foreign.price, 9)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY imports need PostgreSQL')
+    def test_import_copy_chunks(self):
+        """Check if large imports COPY every chunk through its own staging table"""
+        body = 'name,description,price,quantity,category_id\n'
+        body += ''.join(f'Bulb {i},Bulbs,2.50,10,{self.category.id}\n' for i in range(5))
+        # The test's transaction stays open across chunks, like an outer atomic block
+        with self.settings(PRODUCT_IMPORT_COPY_MIN_BYTES=0, PRODUCT_IMPORT_COPY_CHUNK_SIZE=2):
+            response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Product.objects.filter(seller=self.seller, name__startswith='Bulb').count(), 5)
+
+    def test_import_requires_seller_and_known_type(self):
+        """Check if only sellers can import, and only CSV or NDJSON"""
+        response = self.client.post(self.url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 415)
+        self.client.force_authenticate(User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass'))
+        response = self.client.post(self.url, 'name\nPot\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
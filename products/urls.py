@@ -3,10 +3,15 @@ from . import views
 
 urlpatterns = [
     path('', views.list_products, name='product-list'),  # GET /api/v1/Product
+    path('search/', views.search_products, name='product-search'),  # GET /api/v1/Product/search/?q=
+    path('changes/', views.product_changes, name='product-changes'),  # GET /api/v1/Product/changes/?since=
     path('<int:pk>/', views.retrieve_product, name='product-detail'),  # GET /api/v1/Product/:id
     path('create/', views.create_product, name='product-create'),  # POST /api/v1/Product
+    path('bulk/', views.bulk_import_products, name='product-bulk'),  # POST /api/v1/Product/bulk/
     path('<int:pk>/update/', views.update_product, name='product-update'),  # PUT /api/v1/Product/:id
     path('<int:pk>/delete/', views.delete_product, name='product-delete'),  # DELETE /api/v1/Product/:id
     path('update-Image-Product/<int:pk>/', views.update_product_image, name='product-update-image'),  # PUT /api/v1/Product/update-Image-Product/:id
     path('my/', views.my_products, name='my-products'),  # GET /api/v1/products/my/
+    path('export/', views.export_products, name='product-export'),  # GET /api/v1/Product/export/?output=csv
+    path('cache-stats/', views.document_cache_stats, name='product-cache-stats'),  # GET /api/v1/Product/cache-stats/
 ]
@@ -2,9 +2,22 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Product
-from .serializers import ProductSerializer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from .models import Product, ProductTombstone
+from .serializers import ProductChangeSerializer, ProductSerializer
+from .pagination import ProductPagination
+from .search import decode_cursor, encode_cursor, search_product_ids
+from .facets import FilterError, filter_products, facet_counts
+from .cache import product_documents
+from .bulk import CSV_TYPES, NDJSON_TYPES, BulkImportError, ProductImport, read_csv, read_ndjson
 from categories.models import Category
+from categories.cache import category_documents
+from commerce.images import ImageError, store_image_value
+from commerce.conditional import add_validators, not_modified
+from commerce.changes import change_feed
+from commerce.exports import export_response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -17,22 +30,89 @@ def create_product(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_import_products(request):
+    if getattr(request.user, 'role', None) != 'seller':
+        return Response({'detail': 'Only sellers can create products.'}, status=status.HTTP_403_FORBIDDEN)
+    media_type = request.content_type.split(';')[0].strip()
+    if media_type in CSV_TYPES:
+        reader = read_csv
+    elif media_type in NDJSON_TYPES:
+        reader = read_ndjson
+    else:
+        return Response({'detail': 'Send text/csv or application/x-ndjson.'}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    if request.stream is None:
+        return Response({'detail': 'Empty body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The body is read a line at a time, never through request.data
+    size = int(request.META.get('CONTENT_LENGTH') or 0)
+    if size >= settings.PRODUCT_IMPORT_COPY_MIN_BYTES:
+        importer = ProductImport(request.user, settings.PRODUCT_IMPORT_COPY_CHUNK_SIZE, copy=True)
+    else:
+        importer = ProductImport(request.user, settings.PRODUCT_IMPORT_CHUNK_SIZE)
+    try:
+        importer.run(reader(request.stream))
+    except BulkImportError as e:
+        # Chunks before the bad line are already saved
+        return Response({'detail': str(e), **importer.report}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(importer.report)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def list_products(request):
-    products = Product.objects.all()
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    try:
+        products = filter_products(Product.objects.all(), request.query_params)
+    except FilterError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    paginator = ProductPagination()
+    page = paginator.paginate_queryset(ProductSerializer.setup_eager_loading(products), request)
+    serializer = ProductSerializer(page, many=True)
+    response = paginator.get_paginated_response(serializer.data)
+    # Facets describe the whole filtered result, so only the first page carries them
+    if not request.query_params.get(paginator.cursor_query_param):
+        response.data['facets'] = facet_counts(products)
+    return response
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_products(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'detail': 'Search query is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    after = None
+    if request.query_params.get('cursor'):
+        try:
+            after = decode_cursor(request.query_params['cursor'])
+        except ValueError:
+            return Response({'detail': 'Invalid cursor.'}, status=status.HTTP_404_NOT_FOUND)
+    page_size = api_settings.PAGE_SIZE
+    # Fetch one extra id to know whether there is a next page without counting
+    matches = search_product_ids(query, page_size + 1, after)
+    has_next = len(matches) > page_size
+    matches = matches[:page_size]
+    product_ids = [pk for pk, _ in matches]
+    products = ProductSerializer.setup_eager_loading(Product.objects.all()).in_bulk(product_ids)
+    serializer = ProductSerializer([products[pk] for pk in product_ids if pk in products], many=True)
+    next_url = None
+    if has_next:
+        pk, score = matches[-1]
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(score, pk))
+    return Response({'next': next_url, 'results': serializer.data})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_changes(request):
+    return change_feed(request, Product.objects.all(), ProductTombstone.objects.all(), ProductChangeSerializer)
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def retrieve_product(request, pk):
-    try:
-        product = Product.objects.get(pk=pk)
-    except Product.DoesNotExist:
+    # The cached document carries its version stamp, so a 304 costs one cache read
+    document = product_documents.get(pk)
+    if document is None:
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = ProductSerializer(product)
-    return Response(serializer.data)
+    return not_modified(request, pk, document['updated_at']) or add_validators(Response(document['data']), pk, document['updated_at'])
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
@@ -70,7 +150,11 @@ def update_product_image(request, pk):
         return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
     if product.seller != request.user and not request.user.is_superuser:
         return Response({'detail': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
-    image = request.data.get('imageProduct')
+    # Accepts a multipart file, a data:image/...;base64 URI, or a file name
+    try:
+        image = store_image_value(request, 'imageProduct')
+    except ImageError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     if not image:
         return Response({'detail': 'No image provided.'}, status=status.HTTP_400_BAD_REQUEST)
     product.imageProduct = image
@@ -82,5 +166,20 @@ def update_product_image(request, pk):
 @permission_classes([IsAuthenticated])
 def my_products(request):
     products = Product.objects.filter(seller=request.user)
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    paginator = ProductPagination()
+    page = paginator.paginate_queryset(ProductSerializer.setup_eager_loading(products), request)
+    serializer = ProductSerializer(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def export_products(request):
+    return export_response(request, 'products')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def document_cache_stats(request):
+    return Response({
+        'product': product_documents.stats(),
+        'category': category_documents.stats(),
+    })
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.models import User
+from products.models import Product
+from reviews.ratings import rebuild_product_ratings, rebuild_seller_ratings
+
+class Command(BaseCommand):
+    help = 'Recompute product and seller rating aggregates from reviews in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of products or sellers recomputed per transaction',
+        )
+
+    def rebuild(self, queryset, rebuild, batch_size):
+        last_pk, total = 0, 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return total
+            with transaction.atomic():
+                rebuild(batch)
+            last_pk = batch[-1]
+            total += len(batch)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products = self.rebuild(Product.objects.all(), rebuild_product_ratings, batch_size)
+        sellers = self.rebuild(User.objects.filter(products__isnull=False).distinct(), rebuild_seller_ratings, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings of {products} products and {sellers} sellers.'))
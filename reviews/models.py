@@ -11,6 +11,12 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            # Review feeds and per-product top-k, see reviews.pagination
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+            # A reviewer's own feed, newest first, see reviews.pagination
+            models.Index(fields=['user', '-created_at', '-id'], name='review_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating})"
@@ -0,0 +1,21 @@
+from commerce.pagination import KeysetPagination
+
+
+class ReviewPagination(KeysetPagination):
+    # Every ordering leads with the product so a feed reads one product's
+    # reviews after another off the (product, created_at, id) index
+    orderings = {
+        'oldest': ('product_id', 'created_at', 'id'),
+        'newest': ('product_id', '-created_at', '-id'),
+    }
+    default_ordering = 'oldest'
+
+
+class MyReviewPagination(KeysetPagination):
+    # A reviewer's own reviews stay newest first, as before they were paged,
+    # read off the (user, -created_at, -id) index
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+    }
+    default_ordering = 'newest'
@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, NullIf
+from django.utils import timezone
+
+from products.models import Product
+from products.cache import product_documents
+from .models import Review
+
+STARS = range(1, 6)
+RATING_FIELDS = ['rating_avg', 'rating_count', *[f'rating_{star}' for star in STARS]]
+
+
+def _average(total, count, output_field):
+    # NULLIF turns an empty aggregate into NULL so it falls back to 0
+    average = Coalesce(Cast(total, FloatField()) / NullIf(count, Value(0)), Value(0.0), output_field=FloatField())
+    return Cast(Least(average, Value(5.0)), output_field)
+
+
+def _shifted(name, delta):
+    # Rows written before the aggregates were backfilled can be behind,
+    # never let a decrement take a counter below zero
+    return Greatest(F(name) + delta, Value(0)) if delta < 0 else F(name) + delta
+
+
+def _deltas(old, new):
+    deltas = {}
+    if old is not None:
+        deltas[old] = deltas.get(old, 0) - 1
+    if new is not None:
+        deltas[new] = deltas.get(new, 0) + 1
+    return {star: delta for star, delta in deltas.items() if delta}
+
+
+def record_rating(product_id, old=None, new=None):
+    """
+    Move one review of `product_id` from star rating `old` to `new` (either
+    may be None for an added or deleted review) in the product's histogram
+    and average and in its seller's totals. Two UPDATEs on single rows
+    whatever the number of reviews, plus a lookup of the seller. Must be
+    called inside transaction.atomic() with the review write.
+    """
+    deltas = _deltas(old, new)
+    if not deltas:
+        return
+    seller_id = Product.objects.filter(pk=product_id).values_list('seller_id', flat=True).first()
+
+    # The right-hand sides all read the row before the update, so count and
+    # average are derived from the new histogram expressions
+    histogram = {star: _shifted(f'rating_{star}', deltas.get(star, 0)) for star in STARS}
+    product_count = sum(histogram.values())
+    product_total = sum(bucket * star for star, bucket in histogram.items())
+    Product.objects.filter(pk=product_id).update(
+        rating_count=product_count,
+        rating_avg=_average(product_total, product_count, Product._meta.get_field('rating_avg')),
+        updated_at=timezone.now(),
+        **{f'rating_{star}': histogram[star] for star in deltas},
+    )
+
+    User = get_user_model()
+    seller_total = _shifted('ratingSum', sum(star * delta for star, delta in deltas.items()))
+    seller_count = _shifted('ratingCount', sum(deltas.values()))
+    User.objects.filter(pk=seller_id).update(
+        ratingSum=seller_total,
+        ratingCount=seller_count,
+        rating=_average(seller_total, seller_count, User._meta.get_field('rating')),
+        updated_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: product_documents.invalidate(product_id))
+    _invalidate_sellers_after_commit([seller_id])
+
+
+def _invalidate_sellers_after_commit(seller_ids):
+    # update() sends no post_save, so retire the product documents that
+    # embed the seller as products.signals would have
+    transaction.on_commit(
+        lambda: product_documents.invalidate_scope(*[f'seller:{seller_id}' for seller_id in seller_ids])
+    )
+
+
+def rebuild_product_ratings(product_ids):
+    """
+    Recompute the rating columns of `product_ids` from their reviews. Must be
+    called inside transaction.atomic(); the product rows are locked first so
+    a review written meanwhile applies its delta after the rebuild.
+    """
+    list(Product.objects.select_for_update().filter(pk__in=product_ids).values_list('pk', flat=True))
+    histograms = {product_id: dict.fromkeys(STARS, 0) for product_id in product_ids}
+    rows = (
+        Review.objects.filter(product_id__in=product_ids)
+        .values('product_id', 'rating')
+        .annotate(count=Count('id'))
+        .values_list('product_id', 'rating', 'count')
+    )
+    for product_id, rating, count in rows:
+        if rating in STARS:
+            histograms[product_id][rating] = count
+
+    products = []
+    for product_id, histogram in histograms.items():
+        count = sum(histogram.values())
+        total = sum(star * n for star, n in histogram.items())
+        product = Product(pk=product_id, rating_count=count, rating_avg=(Decimal(total) / count).quantize(Decimal('0.01')) if count else 0)
+        for star in STARS:
+            setattr(product, f'rating_{star}', histogram[star])
+        products.append(product)
+    Product.objects.bulk_update(products, RATING_FIELDS)
+    transaction.on_commit(lambda: product_documents.invalidate(*product_ids))
+
+
+def rebuild_seller_ratings(seller_ids):
+    """
+    Recompute ratingSum, ratingCount and rating of `seller_ids` from their
+    products' reviews. Must be called inside transaction.atomic().
+    """
+    User = get_user_model()
+    list(User.objects.select_for_update().filter(pk__in=seller_ids).values_list('pk', flat=True))
+    reviews = Review.objects.filter(product__seller_id=OuterRef('pk')).order_by().values('product__seller_id')
+    total = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+    count = Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0)
+    User.objects.filter(pk__in=seller_ids).update(ratingSum=total, ratingCount=count)
+    User.objects.filter(pk__in=seller_ids).update(
+        rating=_average(F('ratingSum'), F('ratingCount'), User._meta.get_field('rating')),
+        updated_at=timezone.now(),
+    )
+    _invalidate_sellers_after_commit(list(seller_ids))
@@ -1,15 +1,22 @@
 from rest_framework import serializers
+from commerce.serializers import EagerLoadingMixin
 from .models import Review
 from products.serializers import ProductSerializer
 
 # Create your serializers here.
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=ProductSerializer.Meta.model.objects.all(), source='product', write_only=True)
     user = serializers.StringRelatedField(read_only=True)
     user_name = serializers.SerializerMethodField()
 
+    def validate_rating(self, value):
+        # Product keeps one histogram column per star, see reviews.ratings
+        if not 1 <= value <= 5:
+            raise serializers.ValidationError('Rating must be between 1 and 5.')
+        return value
+
     def get_user_name(self, obj):
         user = obj.user
         if hasattr(user, 'get_full_name') and user.get_full_name():
@@ -18,4 +25,27 @@ class ReviewSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Review
-        fields = ['id', 'user', 'user_name', 'product', 'product_id', 'rating', 'review', 'created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'user', 'user_name', 'product', 'product_id', 'rating', 'review', 'created_at', 'updated_at']
+        select_related = ['user', *ProductSerializer.nested_select_related('product')]
+        only = [
+            'id', 'user', 'product', 'rating', 'review', 'created_at', 'updated_at',
+            'user__username', 'user__first_name', 'user__last_name',
+            *ProductSerializer.nested_only('product'),
+        ]
+
+class SlimReviewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """A review with its product id instead of the product document, for ?slim=1 feeds."""
+    product_id = serializers.IntegerField(read_only=True)
+    user = serializers.StringRelatedField(read_only=True)
+    user_name = serializers.SerializerMethodField()
+
+    get_user_name = ReviewSerializer.get_user_name
+
+    class Meta:
+        model = Review
+        fields = ['id', 'user', 'user_name', 'product_id', 'rating', 'review', 'created_at', 'updated_at']
+        select_related = ['user']
+        only = [
+            'id', 'user', 'product', 'rating', 'review', 'created_at', 'updated_at',
+            'user__username', 'user__first_name', 'user__last_name',
+        ]
@@ -0,0 +1,59 @@
+import threading
+
+from django.conf import settings
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from products.models import Product
+from .models import Review
+from .ratings import rebuild_product_ratings, rebuild_seller_ratings, record_rating
+
+# A review deleted on its own moves its rating out of the aggregates with
+# record_rating(). Reviews swept away by a product, category or reviewer
+# delete are only noted here, and the aggregates they touched are rebuilt
+# once from the rows left when the deletion reaches a product or user: a
+# few grouped queries instead of several per review.
+#
+# The Collector sends every pre_delete first, then deletes the reviews
+# before the products and users they point to, in one transaction.
+
+_pending = threading.local()
+
+
+def _cascade(origin):
+    cascade = getattr(_pending, 'cascade', None)
+    if cascade is None or cascade['origin'] is not origin:
+        cascade = _pending.cascade = {'origin': origin, 'products': set(), 'sellers': {}}
+    return cascade
+
+
+@receiver(pre_delete, sender=Product)
+def note_deleted_product(sender, instance, origin=None, **kwargs):
+    # Its seller cannot be looked up once the row is gone
+    _cascade(origin)['sellers'][instance.pk] = instance.seller_id
+
+
+@receiver(post_delete, sender=Review)
+def unrecord_deleted_review(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Review) or getattr(origin, 'model', None) is Review:
+        record_rating(instance.product_id, old=instance.rating)
+    else:
+        _cascade(origin)['products'].add(instance.product_id)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def rebuild_cascaded_ratings(sender, instance, origin=None, **kwargs):
+    cascade = getattr(_pending, 'cascade', None)
+    if cascade is None or cascade['origin'] is not origin:
+        return
+    _pending.cascade = None
+    products, deleted = cascade['products'], cascade['sellers']
+    if not products:
+        return
+    remaining = set(products) - set(deleted)
+    sellers = {deleted[product_id] for product_id in products if product_id in deleted}
+    sellers.update(Product.objects.filter(pk__in=remaining).values_list('seller_id', flat=True))
+    if remaining:
+        rebuild_product_ratings(sorted(remaining))
+    rebuild_seller_ratings(sorted(sellers))
@@ -1,4 +1,10 @@
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -11,6 +17,7 @@ from .models import Review
 
 class ReviewAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass')
         self.other_user = User.objects.create_user(username='other_buyer', email='other@example.com', password='otherpass')
         self.category = Category.objects.create(name='Tech', description='Tech category')
@@ -41,7 +48,66 @@ class ReviewAPITestCase(APITestCase):
         url = reverse('review-list', args=[self.product.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
+
+    def test_list_reviews_query_count(self):
+        """Check if listing reviews is a single query"""
+        url = reverse('review-list', args=[self.product.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['product']['category']['name'], 'Tech')
+
+    def test_list_all_reviews_paginated(self):
+        """Check if the review feed pages with a cursor, grouped by product"""
+        other_product = Product.objects.create(
+            name='Tablet', description='A tablet', price=300.00, quantity=3, category=self.category, seller=self.other_user
+        )
+        Review.objects.create(user=self.user, product=other_product, rating=2)
+        url = reverse('review-list-all')
+        first = self.client.get(url, {'page_size': 2})
+        self.assertEqual([r['product']['id'] for r in first.data['results']], [self.product.id, self.product.id])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([r['product']['id'] for r in second.data['results']], [other_product.id])
+        self.assertIsNone(second.data['next'])
+
+    def test_my_reviews_newest_first(self):
+        """Check if my reviews list the newest review first"""
+        other_product = Product.objects.create(
+            name='Tablet', description='A tablet', price=300.00, quantity=3, category=self.category, seller=self.other_user
+        )
+        newer = Review.objects.create(user=self.user, product=other_product, rating=2)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('my-reviews-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data['results']], [newer.id, self.review.id])
+
+    def test_slim_review_feed(self):
+        """Check if ?slim=1 returns the product id instead of the product"""
+        response = self.client.get(reverse('review-list', args=[self.product.id]), {'slim': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['product_id'], self.product.id)
+        self.assertNotIn('product', response.data['results'][0])
+
+    def test_batch_reviews_top_k(self):
+        """Check if the batch endpoint returns the newest k reviews per product in one query"""
+        other_product = Product.objects.create(
+            name='Tablet', description='A tablet', price=300.00, quantity=3, category=self.category, seller=self.other_user
+        )
+        Review.objects.create(user=self.user, product=other_product, rating=2)
+        url = reverse('review-batch')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'product_ids': f'{self.product.id},{other_product.id},999', 'k': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data[str(self.product.id)]], [self.review.id])
+        self.assertEqual(len(response.data[str(other_product.id)]), 1)
+        self.assertEqual(response.data['999'], [])
+
+    def test_batch_reviews_invalid_params(self):
+        response = self.client.get(reverse('review-batch'), {'product_ids': 'a,b'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('review-batch'), {'product_ids': '1', 'k': 0})
+        self.assertEqual(response.status_code, 400)
 
     def test_update_review(self):
         self.client.login(username='buyer', password='buyerpass')
@@ -88,6 +154,70 @@ class ReviewAPITestCase(APITestCase):
         url = reverse('my-products')
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
-        product_ids = [prod['id'] for prod in response.data]
+        product_ids = [prod['id'] for prod in response.data['results']]
         self.assertIn(self.product.id, product_ids)
         self.assertNotIn(other_product.id, product_ids)
+
+    def assertRatings(self, avg, histogram, seller_rating):
+        self.product.refresh_from_db()
+        self.user.refresh_from_db()
+        self.assertEqual(self.product.rating_avg, Decimal(avg))
+        self.assertEqual([getattr(self.product, f'rating_{star}') for star in range(1, 6)], histogram)
+        self.assertEqual(self.product.rating_count, sum(histogram))
+        self.assertEqual(self.user.rating, Decimal(seller_rating))
+
+    def test_rating_aggregates_follow_review_writes(self):
+        """Check if add, update and delete keep the product and seller ratings current"""
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRatings('4.50', [0, 0, 0, 1, 1], '4.5')
+
+        new_user = User.objects.create_user(username='new_buyer', email='new@example.com', password='newpass')
+        self.client.force_authenticate(new_user)
+        response = self.client.post(reverse('review-add', args=[self.product.id]), {'rating': 3})
+        self.assertEqual(response.data['product']['rating_count'], 3)
+        self.assertRatings('4.00', [0, 0, 1, 1, 1], '4.0')
+
+        self.client.force_authenticate(self.user)
+        self.client.put(reverse('review-update', args=[self.review.id]), {'rating': 1})
+        self.assertRatings('3.00', [1, 0, 1, 0, 1], '3.0')
+
+        self.client.delete(reverse('review-delete', args=[self.review.id]))
+        self.assertRatings('4.00', [0, 0, 1, 0, 1], '4.0')
+
+        response = self.client.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(response.data['rating_histogram'], {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1})
+
+    def test_rating_aggregates_follow_cascades(self):
+        """Check if reviews removed by a reviewer or product delete leave the aggregates"""
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.other_user.delete()
+        self.assertRatings('4.00', [0, 0, 0, 1, 0], '4.0')
+
+        self.product.delete()
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.ratingSum, self.user.ratingCount, self.user.rating), (0, 0, Decimal('0.0')))
+
+    def test_cascade_rebuilds_once(self):
+        """Check if deleting a reviewer costs the same queries however many reviews go with them"""
+        def reviewer_with(count):
+            reviewer = User.objects.create_user(username=f'reviewer{count}', password='pass')
+            for i in range(count):
+                product = Product.objects.create(name=f'Case {count}-{i}', description='Case', price=5, quantity=1,
+                                                 category=self.category, seller=self.user)
+                Review.objects.create(user=reviewer, product=product, rating=3)
+            return reviewer
+
+        few, many = reviewer_with(1), reviewer_with(6)
+        call_command('rebuild_ratings', stdout=StringIO())
+        with CaptureQueriesContext(connection) as one:
+            few.delete()
+        with CaptureQueriesContext(connection) as six:
+            many.delete()
+        self.assertEqual(len(six), len(one))
+        self.assertRatings('4.50', [0, 0, 0, 1, 1], '4.5')
+
+    def test_rating_out_of_range(self):
+        """Check if ratings outside 1-5 are rejected"""
+        self.client.force_authenticate(self.user)
+        response = self.client.put(reverse('review-update', args=[self.review.id]), {'rating': 6})
+        self.assertEqual(response.status_code, 400)
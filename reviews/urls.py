@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('', views.list_all_reviews, name='review-list-all'),  # GET /api/v1/Review/
+    path('export/', views.export_reviews, name='review-export'),  # GET /api/v1/Review/export/?output=csv
+    path('batch/', views.batch_reviews, name='review-batch'),  # GET /api/v1/Review/batch/?product_ids=1,2&k=3
     path('<int:product_id>/', views.add_review, name='review-add'),  # POST /api/v1/Review/:productId
     path('<int:product_id>/list/', views.list_reviews, name='review-list'),  # GET /api/v1/Review/:productId
     path('<int:review_id>/update/', views.update_review, name='review-update'),  # PUT /api/v1/Review/:reviewId
@@ -1,14 +1,36 @@
 from django.shortcuts import render
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from .models import Review
-from .serializers import ReviewSerializer
+from .serializers import ReviewSerializer, SlimReviewSerializer
+from .pagination import MyReviewPagination, ReviewPagination
+from .ratings import RATING_FIELDS, record_rating
 from products.models import Product
+from commerce.exports import export_response
 
 # Create your views here.
 
+# Limits of GET /api/v1/Review/batch/
+BATCH_MAX_PRODUCTS = 100
+BATCH_DEFAULT_K = 3
+BATCH_MAX_K = 20
+
+def _is_slim(request):
+    return request.query_params.get('slim', '').lower() in ('1', 'true', 'yes')
+
+def _review_feed(request, reviews, pagination_class=ReviewPagination):
+    # ?slim=1 swaps the nested product document for its id
+    serializer_class = SlimReviewSerializer if _is_slim(request) else ReviewSerializer
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(serializer_class.setup_eager_loading(reviews), request)
+    serializer = serializer_class(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_review(request, product_id):
@@ -24,7 +46,10 @@ def add_review(request, product_id):
     data['user'] = request.user.id
     serializer = ReviewSerializer(data=data)
     if serializer.is_valid():
-        serializer.save(user=request.user, product=product)
+        with transaction.atomic():
+            review = serializer.save(user=request.user, product=product)
+            record_rating(product.pk, new=review.rating)
+        product.refresh_from_db(fields=RATING_FIELDS + ['updated_at'])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -32,38 +57,46 @@ def add_review(request, product_id):
 @permission_classes([AllowAny])
 def list_reviews(request, product_id):
     reviews = Review.objects.filter(product_id=product_id)
-    serializer = ReviewSerializer(reviews, many=True)
-    return Response(serializer.data)
+    return _review_feed(request, reviews)
 
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_review(request, review_id):
-    try:
-        review = Review.objects.get(pk=review_id, user=request.user)
-    except Review.DoesNotExist:
-        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = ReviewSerializer(review, data=request.data, partial=True)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    with transaction.atomic():
+        try:
+            # Lock the review so concurrent edits apply their rating changes in turn
+            review = Review.objects.select_for_update().get(pk=review_id, user=request.user)
+        except Review.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        old_product_id, old_rating = review.product_id, review.rating
+        serializer = ReviewSerializer(review, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        review = serializer.save()
+        if review.product_id == old_product_id:
+            record_rating(review.product_id, old=old_rating, new=review.rating)
+        else:
+            record_rating(old_product_id, old=old_rating)
+            record_rating(review.product_id, new=review.rating)
+    return Response(serializer.data)
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_review(request, review_id):
-    try:
-        review = Review.objects.get(pk=review_id, user=request.user)
-    except Review.DoesNotExist:
-        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-    review.delete()
+    with transaction.atomic():
+        try:
+            review = Review.objects.select_for_update().get(pk=review_id, user=request.user)
+        except Review.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        # reviews.signals takes the rating out of the aggregates
+        review.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def my_reviews(request):
     reviews = Review.objects.filter(user=request.user)
-    serializer = ReviewSerializer(reviews, many=True)
-    return Response(serializer.data)
+    return _review_feed(request, reviews, MyReviewPagination)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -76,5 +109,37 @@ def my_review_for_product(request, product_id):
 @permission_classes([AllowAny])
 def list_all_reviews(request):
     reviews = Review.objects.all()
-    serializer = ReviewSerializer(reviews, many=True)
-    return Response(serializer.data)
+    return _review_feed(request, reviews)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def export_reviews(request):
+    return export_response(request, 'reviews')
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def batch_reviews(request):
+    # GET /api/v1/Review/batch/?product_ids=1,2,3&k=3 -> newest k reviews of each product
+    try:
+        product_ids = list(dict.fromkeys(int(part) for part in request.query_params.get('product_ids', '').split(',') if part.strip()))
+        k = int(request.query_params.get('k', BATCH_DEFAULT_K))
+    except ValueError:
+        return Response({'detail': 'product_ids and k must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+    if not product_ids:
+        return Response({'detail': 'product_ids is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(product_ids) > BATCH_MAX_PRODUCTS:
+        return Response({'detail': f'At most {BATCH_MAX_PRODUCTS} product_ids are allowed.'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= k <= BATCH_MAX_K:
+        return Response({'detail': f'k must be between 1 and {BATCH_MAX_K}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # One query: number each product's reviews newest first and keep the first k
+    reviews = SlimReviewSerializer.setup_eager_loading(
+        Review.objects.filter(product_id__in=product_ids)
+        .annotate(row=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('created_at').desc(), F('id').desc()]))
+        .filter(row__lte=k)
+        .order_by('product_id', 'row')
+    )
+    results = {str(product_id): [] for product_id in product_ids}
+    for review in SlimReviewSerializer(reviews, many=True).data:
+        results[str(review['product_id'])].append(review)
+    return Response(results)
@@ -0,0 +1,10 @@
+from commerce.cache import CachedCount
+
+from .models import WishlistItem
+
+
+def _count_wishlist_items(user_id):
+    return WishlistItem.objects.filter(user_id=user_id).count()
+
+
+wishlist_counts = CachedCount('wishlist:count', _count_wishlist_items)
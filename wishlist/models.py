@@ -1,13 +1,39 @@
-from django.db import models
+from django.db import models, connection
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 
+class WishlistItemManager(models.Manager):
+    def add(self, user, product_id):
+        """
+        Add a product to the user's wishlist with a single
+        INSERT ... ON CONFLICT DO NOTHING. Returns the new item id, or None if
+        the product is already in the wishlist or does not exist.
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        products = qn(self.model._meta.get_field('product').related_model._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        sql = (
+            f'INSERT INTO {table} ({qn("user_id")}, {qn("product_id")}, {qn("added_at")}) '
+            f'SELECT %s, {qn("id")}, %s FROM {products} WHERE {qn("id")} = %s '
+            f'ON CONFLICT ({qn("user_id")}, {qn("product_id")}) DO NOTHING '
+            f'RETURNING {qn("id")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, now, product_id])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
 class WishlistItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wishlist_items')
     product = models.ForeignKey('products.Product', on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = WishlistItemManager()
+
     class Meta:
         unique_together = ('user', 'product')
 
@@ -1,14 +1,21 @@
 from rest_framework import serializers
+from commerce.serializers import EagerLoadingMixin
 from .models import WishlistItem
 from products.serializers import ProductSerializer
 
 # Create your serializers here.
 
-class WishlistItemSerializer(serializers.ModelSerializer):
+class WishlistItemSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=ProductSerializer.Meta.model.objects.all(), source='product', write_only=True)
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = WishlistItem
-        fields = ['id', 'user', 'product', 'product_id', 'added_at'] 
\ No newline at end of file
+        fields = ['id', 'user', 'product', 'product_id', 'added_at']
+        select_related = ['user', *ProductSerializer.nested_select_related('product')]
+        only = [
+            'id', 'user', 'product', 'added_at',
+            'user__username',
+            *ProductSerializer.nested_only('product'),
+        ]
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .cache import wishlist_counts
+from .models import WishlistItem
+
+
+@receiver(post_delete, sender=WishlistItem)
+def invalidate_wishlist_count(sender, instance, **kwargs):
+    # Also covers rows removed by a product or user cascade
+    wishlist_counts.invalidate(instance.user_id)
@@ -1,4 +1,5 @@
 from django.test import TestCase
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -11,6 +12,7 @@ from .models import WishlistItem
 
 class WishlistAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='buyerpass')
         self.category = Category.objects.create(name='Tech', description='Tech category')
         self.product = Product.objects.create(
@@ -29,6 +31,47 @@ class WishlistAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 201)
         self.assertTrue(WishlistItem.objects.filter(user=self.user, product=self.product).exists())
 
+    def test_add_to_wishlist_twice(self):
+        """Check if a product cannot be wishlisted twice"""
+        self.client.login(username='buyer', password='buyerpass')
+        url = reverse('wishlist-add', args=[self.product.id])
+        self.client.post(url)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(WishlistItem.objects.filter(user=self.user).count(), 1)
+
+    def test_add_to_wishlist_missing_product(self):
+        self.client.login(username='buyer', password='buyerpass')
+        response = self.client.post(reverse('wishlist-add', args=[self.product.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_wishlist(self):
+        """Check if a batch of add/remove operations is applied in one call"""
+        other = Product.objects.create(name='Case', description='A case', price=10.00, quantity=10,
+                                       category=self.category, seller=self.user)
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        self.client.login(username='buyer', password='buyerpass')
+        operations = [
+            {'op': 'add', 'product_id': self.product.id},
+            {'op': 'add', 'product_id': other.id},
+            {'op': 'remove', 'product_id': self.product.id},
+        ]
+        response = self.client.post(reverse('wishlist-batch'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['product']['id'] for item in response.data], [other.id])
+
+    def test_wishlist_count_is_cached_and_invalidated(self):
+        """Check if the badge count is served from the cache until the wishlist changes"""
+        self.client.force_authenticate(self.user)
+        url = reverse('wishlist-count')
+        self.assertEqual(self.client.get(url).data['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('wishlist-add', args=[self.product.id]))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).data['count'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['count'], 1)
+
     def test_remove_from_wishlist(self):
         self.client.login(username='buyer', password='buyerpass')
         WishlistItem.objects.create(user=self.user, product=self.product)
@@ -45,6 +88,17 @@ class WishlistAPITestCase(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_list_wishlist_query_count(self):
+        """Check if listing the wishlist is a single query"""
+        for i in range(3):
+            product = Product.objects.create(name=f'Item {i}', description='Item', price=1.00,
+                                             quantity=1, category=self.category, seller=self.user)
+            WishlistItem.objects.create(user=self.user, product=product)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('wishlist-list'))
+        self.assertEqual(len(response.data), 3)
+
     def test_permission_required_for_add(self):
         url = reverse('wishlist-add', args=[self.product.id])
         response = self.client.post(url)
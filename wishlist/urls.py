@@ -5,4 +5,6 @@ urlpatterns = [
     path('<int:product_id>/', views.add_to_wishlist, name='wishlist-add'),  # POST /api/v1/Wishlist/:ProductId
     path('<int:product_id>/delete/', views.remove_from_wishlist, name='wishlist-remove'),  # DELETE /api/v1/Wishlist/:ProductId
     path('', views.list_wishlist, name='wishlist-list'),  # GET /api/v1/Wishlist/
+    path('batch/', views.batch_wishlist, name='wishlist-batch'),  # POST /api/v1/Wishlist/batch
+    path('count/', views.wishlist_count, name='wishlist-count'),  # GET /api/v1/Wishlist/count
 ] 
\ No newline at end of file
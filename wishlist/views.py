@@ -1,10 +1,13 @@
 from django.shortcuts import render
+from django.db import transaction
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from idempotency.decorators import idempotent
 from .models import WishlistItem
 from .serializers import WishlistItemSerializer
+from .cache import wishlist_counts
 from products.models import Product
 
 # Create your views here.
@@ -12,14 +15,14 @@ from products.models import Product
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def add_to_wishlist(request, product_id):
-    try:
-        product = Product.objects.get(pk=product_id)
-    except Product.DoesNotExist:
-        return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
-    # Prevent duplicate wishlist items
-    if WishlistItem.objects.filter(user=request.user, product=product).exists():
+    wishlist_item_id = WishlistItem.objects.add(request.user, product_id)
+    if wishlist_item_id is None:
+        # Nothing was inserted; only now find out why
+        if not Product.objects.filter(pk=product_id).exists():
+            return Response({'detail': 'Product not found.'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'detail': 'Product already in wishlist.'}, status=status.HTTP_400_BAD_REQUEST)
-    wishlist_item = WishlistItem.objects.create(user=request.user, product=product)
+    wishlist_counts.invalidate(request.user.pk)
+    wishlist_item = WishlistItemSerializer.setup_eager_loading(WishlistItem.objects.all()).get(pk=wishlist_item_id)
     serializer = WishlistItemSerializer(wishlist_item)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -31,6 +34,7 @@ def remove_from_wishlist(request, product_id):
     except WishlistItem.DoesNotExist:
         return Response({'detail': 'Product not in wishlist.'}, status=status.HTTP_404_NOT_FOUND)
     wishlist_item.delete()
+    wishlist_counts.invalidate(request.user.pk)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 @api_view(['GET'])
@@ -39,3 +43,52 @@ def list_wishlist(request):
     wishlist_items = WishlistItem.objects.filter(user=request.user)
     serializer = WishlistItemSerializer(wishlist_items, many=True)
     return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def wishlist_count(request):
+    return Response({'count': wishlist_counts.get(request.user.pk)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def batch_wishlist(request):
+    operations = request.data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return Response({'detail': 'Operations list is required and cannot be empty.'}, status=status.HTTP_400_BAD_REQUEST)
+    # The last operation on a product wins
+    plan = {}
+    errors = []
+    for index, operation in enumerate(operations):
+        try:
+            op = operation['op']
+            product_id = int(operation['product_id'])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            errors.append({'index': index, 'detail': 'Each operation needs an op and a numeric product_id.'})
+            continue
+        if op not in ('add', 'remove'):
+            errors.append({'index': index, 'detail': 'Invalid op.'})
+            continue
+        plan[product_id] = op
+    if errors:
+        return Response({'detail': 'Invalid operations.', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    adds = [product_id for product_id, op in plan.items() if op == 'add']
+    removes = [product_id for product_id, op in plan.items() if op == 'remove']
+    with transaction.atomic():
+        # Locked so none of them can be deleted before the insert references them
+        found = Product.objects.select_for_update(no_key=True).filter(pk__in=adds).order_by('pk').values_list('pk', flat=True)
+        missing = set(adds) - set(found)
+        if missing:
+            return Response({'detail': 'Products not found.', 'products': sorted(missing)}, status=status.HTTP_404_NOT_FOUND)
+        if removes:
+            WishlistItem.objects.filter(user=request.user, product_id__in=removes).delete()
+        WishlistItem.objects.bulk_create(
+            [WishlistItem(user=request.user, product_id=product_id) for product_id in adds],
+            ignore_conflicts=True,
+        )
+    wishlist_counts.invalidate(request.user.pk)
+    wishlist_items = WishlistItem.objects.filter(user=request.user)
+    serializer = WishlistItemSerializer(wishlist_items, many=True)
+    return Response(serializer.data)